@@ -0,0 +1,11 @@
+import shutil
+from functools import partial
+
+
+def pytest_configure(config):
+    # Как в core.test_runner для manage.py test: кэш тестов - во
+    # временном каталоге, а не в каталоге сервера разработки
+    from core.test_runner import isolate_caches
+
+    directory = isolate_caches()
+    config.add_cleanup(partial(shutil.rmtree, directory, ignore_errors=True))
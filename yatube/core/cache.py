@@ -0,0 +1,290 @@
+"""Поколения областей кэша и чтение через кэш без лавины пересчётов.
+
+Версия закэшированной страницы - поколения её областей (лента, группа,
+профиль). Любое изменение данных области записывает новое поколение, и
+старая запись становится устаревшей без ожидания TTL. Поколение - время
+последнего изменения области (time.time()).
+
+fetch() пересчитывает значение в одном воркере: право на пересчёт
+даёт cache.add() блокировки, остальные воркеры тем временем отдают
+прежнее значение. Свежие записи пересчитываются заранее с вероятностью,
+растущей к концу TTL (XFetch), поэтому популярный ключ не истекает у всех
+сразу. Строгая взаимоисключаемость требует атомарного add() у бэкенда
+(memcached, redis, база); файловый кэш изредка пропустит второй пересчёт.
+
+У записи два срока: после мягкого она ещё отдаётся, пока её обновляют,
+после жёсткого (TTL в кэше) исчезает. Устаревшая запись выручает и при
+ошибке БД - например, когда SQLite заблокирована массовой записью.
+"""
+import logging
+import math
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+
+GENERATION_KEY = 'generation:{}'
+LOCK_KEY = 'lock:{}'
+# Сколько держится блокировка пересчёта и сколько её ждут без значения
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+# Устаревшая запись хранится ещё столько же, сколько была свежей
+STALE_FACTOR = 2
+# Склонность XFetch к досрочному пересчёту
+XFETCH_BETA = 1.0
+
+# Ключ фрагмента шаблона для fetch(): часть ключа, версия и not_before
+FragmentKey = namedtuple('FragmentKey', 'key version not_before')
+
+logger = logging.getLogger(__name__)
+
+
+def get_generations(scopes):
+    """Возвращает поколения областей в порядке scopes.
+
+    Поколение области, которой ещё нет в кэше, начинается сейчас.
+    """
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    generations = []
+    updated = {}
+    for key in keys:
+        generation = found.get(key)
+        if generation is None:
+            generation = updated[key] = time.time()
+        generations.append(generation)
+    if updated:
+        cache.set_many(updated, None)
+    return generations
+
+
+def bump(*scopes):
+    """Начинает новое поколение областей."""
+    now = time.time()
+    cache.set_many(
+        {GENERATION_KEY.format(scope): now for scope in scopes}, None
+    )
+    return now
+
+
+def bump_on_commit(*scopes):
+    """bump() сейчас и ещё раз после фиксации текущей транзакции.
+
+    Первый сдвиг нужен чтениям в самой транзакции. Между ним и COMMIT
+    другой воркер может закэшировать данные до изменения под новым
+    поколением - второй сдвиг делает такую запись устаревшей. Вне
+    транзакции сдвиг один.
+    """
+    bump(*scopes)
+    if connection.in_atomic_block:
+        transaction.on_commit(partial(bump, *scopes))
+
+
+class RequestState:
+    """Что fetch() сделал за время запроса: отложенные обновления и
+    отданные устаревшие значения (для заголовка Warning)."""
+
+    def __init__(self):
+        self.refreshes = {}
+        self.stale = False
+        self.failed = False
+
+
+_state = threading.local()
+
+
+@contextmanager
+def request_scope():
+    """Область запроса для fetch() (см. core.middleware)."""
+    state = _state.current = RequestState()
+    try:
+        yield state
+    finally:
+        _state.current = None
+
+
+def _current_request():
+    return getattr(_state, 'current', None)
+
+
+@contextmanager
+def latency_budget(seconds):
+    """Прерывает запросы SQLite дольше seconds, включая ожидание
+    блокировки записи, - они падают с OperationalError.
+
+    Для других СУБД ничего не ограничивает.
+    """
+    if (
+        seconds is None
+        or connection.vendor != 'sqlite'
+        or getattr(_state, 'budget', False)
+    ):
+        # Вложенный fetch() остаётся в бюджете внешнего
+        yield
+        return
+    _state.budget = True
+    connection.ensure_connection()
+    raw = connection.connection
+    deadline = time.monotonic() + seconds
+    busy_timeout, = raw.execute('PRAGMA busy_timeout').fetchone()
+    raw.execute(f'PRAGMA busy_timeout = {int(seconds * 1000)}')
+    raw.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+    try:
+        yield
+    finally:
+        _state.budget = False
+        raw.set_progress_handler(None, 1000)
+        raw.execute(f'PRAGMA busy_timeout = {busy_timeout}')
+
+
+def _usable(entry, not_before):
+    """Можно ли отдать запись, пока её пересчитывает другой воркер."""
+    return entry is not None and (
+        not_before is None or entry[2] >= not_before
+    )
+
+
+def _store(key, compute, timeout, version, cacheable):
+    started = time.time()
+    value = compute()
+    if cacheable is not None and not cacheable(value):
+        return value
+    now = time.time()
+    if timeout is None:
+        expires, ttl = math.inf, None
+    else:
+        expires, ttl = now + timeout, timeout * STALE_FACTOR
+    # Запись: значение, версия, время расчёта, мягкий срок и длительность
+    # расчёта для XFetch; жёсткий срок - TTL записи в кэше
+    cache.set(key, (value, version, started, expires, now - started), ttl)
+    return value
+
+
+def _refresh(key, compute, timeout, version, cacheable):
+    """Обновление после ответа: не больше одного на ключ у всех воркеров."""
+    lock = LOCK_KEY.format(key)
+    if not cache.add(lock, True, LOCK_TIMEOUT):
+        return
+    try:
+        _store(key, compute, timeout, version, cacheable)
+    except DatabaseError:
+        logger.warning('Не удалось обновить %s', key, exc_info=True)
+    finally:
+        cache.delete(lock)
+
+
+def fetch(key, compute, timeout, version=None, not_before=None,
+          cacheable=None):
+    """Значение ключа из кэша или compute(), пересчитанное одним воркером.
+
+    version - версия данных (например, поколения областей): запись другой
+    версии устарела. Пока её пересчитывают, она отдаётся как есть.
+    Запись, посчитанная раньше not_before, не отдаётся совсем, даже той же
+    версии, - так автор изменения не увидит страницу без него.
+    cacheable(value) решает, сохранять ли результат.
+
+    Запись той же версии после мягкого срока (timeout) отдаётся сразу, а
+    обновляется после ответа (stale-while-revalidate). Если пересчёт
+    устаревшей записи упал с ошибкой БД или не уложился в
+    CACHE_REFRESH_BUDGET, отдаётся устаревшая запись (stale-if-error).
+    """
+    entry = cache.get(key)
+    state = _current_request()
+    args = (key, compute, timeout, version, cacheable)
+    usable = _usable(entry, not_before)
+    if usable and entry[1] == version:
+        value, _, _, expires, delta = entry
+        now = time.time()
+        early = delta * XFETCH_BETA * -math.log(1 - random.random())
+        if now + early < expires:
+            return value
+        if state is not None:
+            state.refreshes.setdefault(key, partial(_refresh, *args))
+            state.stale |= now >= expires
+            return value
+    lock = LOCK_KEY.format(key)
+    if cache.add(lock, True, LOCK_TIMEOUT):
+        try:
+            if not usable:
+                return _store(*args)
+            return _store_or_stale(entry, state, *args)
+        finally:
+            cache.delete(lock)
+    if usable:
+        if state is not None:
+            state.stale = True
+        return entry[0]
+    return _wait(lock, not_before, *args)
+
+
+def _store_or_stale(entry, state, key, *args):
+    """Пересчёт в бюджете времени; при ошибке БД - устаревшая запись."""
+    try:
+        with latency_budget(settings.CACHE_REFRESH_BUDGET):
+            return _store(key, *args)
+    except DatabaseError:
+        logger.warning('Отдано устаревшее значение %s', key, exc_info=True)
+        if state is not None:
+            state.failed = True
+        return entry[0]
+
+
+def _wait(lock, not_before, key, compute, timeout, version, cacheable):
+    """Подходящего значения нет: ждёт воркер, который его считает."""
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if _usable(entry, not_before) and entry[1] == version:
+            return entry[0]
+        if not cache.has_key(lock):
+            break
+    return _store(key, compute, timeout, version, cacheable)
+
+
+class LRUCache:
+    """Ограниченный кэш процесса с вытеснением давно не читанных ключей.
+
+    Стоит перед общим кэшем для часто читаемых и редко меняющихся
+    значений; timeout ограничивает, как долго процесс может не видеть
+    изменений, сделанных другими процессами.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
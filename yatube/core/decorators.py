@@ -0,0 +1,67 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .cache import fetch, get_generations
+
+PAGE_KEY = 'anonymous_page:{}'
+
+
+def cacheable(response):
+    return response.status_code == 200 and not response.cookies
+
+
+def cache_anonymous_page(scopes):
+    """Кэширует страницу целиком для анонимных GET-запросов.
+
+    scopes(request, *args, **kwargs) возвращает области кэша, от которых
+    зависит страница. ETag строится из адреса и поколений областей,
+    Last-Modified - время последнего изменения, поэтому повторный запрос
+    браузера получает 304 без отрисовки, а остальные - готовое тело из кэша.
+    Устаревшую страницу перерисовывает один воркер, остальные до конца
+    перерисовки отдают прежнюю вместе с её ETag.
+    Запросы с сессией (вошедшие пользователи) идут мимо кэша, чтобы
+    персональная страница не досталась никому другому.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method not in ('GET', 'HEAD')
+                or settings.SESSION_COOKIE_NAME in request.COOKIES
+            ):
+                return view(request, *args, **kwargs)
+            path = request.get_full_path()
+            generations = get_generations(scopes(request, *args, **kwargs))
+            etag = quote_etag(hashlib.md5(
+                f'{path}|{generations}'.encode()
+            ).hexdigest())
+            last_modified = int(max(generations))
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is not None:
+                return response
+
+            def render():
+                response = view(request, *args, **kwargs)
+                if not cacheable(response):
+                    return response
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+                # Браузер хранит страницу, но каждый раз сверяет ETag
+                patch_cache_control(response, no_cache=True)
+                return response
+
+            return fetch(
+                PAGE_KEY.format(hashlib.md5(path.encode()).hexdigest()),
+                render,
+                settings.PAGE_CACHE_TIMEOUT,
+                version=generations,
+                cacheable=cacheable,
+            )
+        return wrapper
+    return decorator
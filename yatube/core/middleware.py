@@ -0,0 +1,41 @@
+from .cache import request_scope
+
+STALE_WARNING = '110 - "Response is Stale"'
+FAILED_WARNING = '111 - "Revalidation Failed"'
+
+
+class DeferredRefresh:
+    """Запускает обновления кэша, когда ответ уже отдан клиенту.
+
+    Сервер вызывает close() у объектов из response._closable_objects
+    после отправки тела - так обновление не задерживает ответ.
+    """
+
+    def __init__(self, refreshes):
+        self.refreshes = refreshes
+
+    def close(self):
+        for refresh in self.refreshes:
+            refresh()
+
+
+class StaleCacheMiddleware:
+    """Область запроса для core.cache.fetch(): помечает ответ с
+    устаревшими данными заголовком Warning и откладывает обновления
+    устаревших записей до окончания ответа."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_scope() as state:
+            response = self.get_response(request)
+        if state.failed:
+            response['Warning'] = FAILED_WARNING
+        elif state.stale:
+            response['Warning'] = STALE_WARNING
+        if state.refreshes:
+            response._closable_objects.append(
+                DeferredRefresh(list(state.refreshes.values()))
+            )
+        return response
@@ -0,0 +1,258 @@
+"""Двухуровневый кэш: память процесса (L1) перед общим кэшем (L2).
+
+NearCache - бэкенд Django-кэша. Чтение сначала ищет ключ в ограниченном
+LRU процесса и только при промахе идёт в общий кэш, запись уходит в оба
+уровня. Каждая запись публикуется в журнал инвалидаций - общий файл
+SQLite на машине, - и остальные процессы при следующем чтении (не чаще
+POLL_INTERVAL) выбрасывают свои копии этих ключей. Изменения постов,
+подписок и комментариев сдвигают поколения (core.cache.bump), поэтому
+доходят до всех воркеров через тот же журнал.
+
+add(), incr() и decr() выполняются только в L2: на них держатся
+блокировки, им нужна атомарность общего кэша.
+
+Запись сначала уходит в L2 и только потом публикуется: иначе другой
+процесс мог бы по сигналу журнала перечитать из L2 старое значение и
+держать его в L1 до следующей записи.
+"""
+import logging
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .cache import LRUCache
+
+# Ключ журнала, по которому процессы очищают L1 целиком
+CLEAR_ALL = '*'
+# Журнал хранит записи столько секунд; отставший дольше процесс
+# очищает L1 полностью
+RETENTION = 60
+# Примерно раз во столько публикаций журнал чистится от старых записей
+PRUNE_EVERY = 100
+
+logger = logging.getLogger(__name__)
+
+# L1 общий для всех потоков процесса: caches[] создаёт бэкенд на поток
+_near = {}
+_near_lock = threading.Lock()
+
+
+class InvalidationBus:
+    """Журнал изменённых ключей в файле SQLite, общий для процессов."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=1)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS invalidation ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'pid INTEGER, key TEXT, created REAL)'
+            )
+            connection.commit()
+            self._local.connection = connection
+        return connection
+
+    def last_id(self):
+        row = self._connection().execute(
+            'SELECT MAX(id) FROM invalidation'
+        ).fetchone()
+        return row[0] or 0
+
+    def publish(self, keys):
+        connection = self._connection()
+        now = time.time()
+        pid = os.getpid()
+        with connection:
+            connection.executemany(
+                'INSERT INTO invalidation (pid, key, created) '
+                'VALUES (?, ?, ?)',
+                [(pid, key, now) for key in keys]
+            )
+            if random.randrange(PRUNE_EVERY) == 0:
+                connection.execute(
+                    'DELETE FROM invalidation WHERE created < ?',
+                    [now - RETENTION]
+                )
+
+    def poll(self, after):
+        """Ключи, изменённые другими процессами после записи after."""
+        rows = self._connection().execute(
+            'SELECT id, key FROM invalidation WHERE id > ? AND pid != ?',
+            [after, os.getpid()]
+        ).fetchall()
+        if not rows:
+            return after, []
+        return rows[-1][0], [key for _, key in rows]
+
+
+class Near:
+    """L1 процесса и его позиция в журнале инвалидаций."""
+
+    def __init__(self, options):
+        self.items = LRUCache(options.get('SIZE', 1000),
+                              options.get('TIMEOUT', 30))
+        self.bus = InvalidationBus(options['BUS'])
+        self.poll_interval = options.get('POLL_INTERVAL', 0.1)
+        self.lock = threading.Lock()
+        self.polled = time.monotonic()
+        try:
+            self.seen = self.bus.last_id()
+        except sqlite3.Error:
+            logger.exception('Журнал инвалидаций недоступен')
+            self.seen = 0
+
+    def sync(self):
+        """Выбрасывает ключи, изменённые другими процессами."""
+        now = time.monotonic()
+        if now - self.polled < self.poll_interval:
+            return
+        with self.lock:
+            if now - self.polled < self.poll_interval:
+                return
+            stale = now - self.polled > RETENTION
+            self.polled = now
+            try:
+                self.seen, keys = self.bus.poll(self.seen)
+            except sqlite3.Error:
+                logger.exception('Журнал инвалидаций недоступен')
+                keys, stale = [], True
+        if stale or CLEAR_ALL in keys:
+            self.items.clear()
+            return
+        for key in keys:
+            self.items.delete(key)
+
+    def publish(self, keys):
+        try:
+            self.bus.publish(keys)
+        except sqlite3.Error:
+            logger.exception('Журнал инвалидаций недоступен')
+
+
+class NearCache(BaseCache):
+    """Бэкенд: OPTIONS['SHARED'] - имя общего кэша в CACHES (L2),
+    SIZE и TIMEOUT - размер и срок жизни L1, BUS - файл журнала,
+    POLL_INTERVAL - как часто читать журнал."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared = caches[options['SHARED']]
+        with _near_lock:
+            self.near = _near.get(options['BUS'])
+            if self.near is None:
+                self.near = _near[options['BUS']] = Near(options)
+
+    def _local_key(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def _remember(self, key, value, version):
+        self.near.items.set(
+            self._local_key(key, version),
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        )
+
+    def _forget(self, keys, version):
+        local_keys = [self._local_key(key, version) for key in keys]
+        for local_key in local_keys:
+            self.near.items.delete(local_key)
+        self.near.publish(local_keys)
+
+    def get(self, key, default=None, version=None):
+        self.near.sync()
+        # Копия из L1 распаковывается заново: вызывающий может её менять
+        data = self.near.items.get(self._local_key(key, version))
+        if data is not None:
+            return pickle.loads(data)
+        value = self.shared.get(key, version=version)
+        if value is None:
+            return default
+        self._remember(key, value, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        self.near.sync()
+        found = {}
+        missing = []
+        for key in keys:
+            data = self.near.items.get(self._local_key(key, version))
+            if data is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(data)
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self._remember(key, value, version)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        self.near.sync()
+        return (
+            self.near.items.get(self._local_key(key, version)) is not None
+            or self.shared.has_key(key, version=version)
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._forget([key], version)
+        self._remember(key, value, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self._forget(list(data), version)
+        for key, value in data.items():
+            if key not in failed:
+                self._remember(key, value, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._forget([key], version)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._forget([key], version)
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        value = self.shared.decr(key, delta, version=version)
+        self._forget([key], version)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version=version)
+        self._forget([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(keys, version=version)
+        self._forget(keys, version)
+
+    def clear(self):
+        self.shared.clear()
+        self.near.items.clear()
+        self.near.publish([CLEAR_ALL])
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,160 @@
+"""Кэш результатов ORM-выборок со сбросом по изменённым таблицам.
+
+Выборка кэшируется под ключом из SQL и параметров запроса, версия
+записи - поколения таблиц, которые запрос читает (core.cache). Любой
+INSERT, UPDATE или DELETE в таблицу из QUERY_CACHE_TABLES, включая
+update(), bulk_create() и сырой SQL, начинает новое поколение таблицы:
+его ловит обёртка выполнения запросов на каждом соединении. Запись
+внутри транзакции сдвигает поколение ещё раз после COMMIT, чтобы другой
+воркер не закэшировал данные, прочитанные до фиксации.
+
+Кэш включается для выборки (.cached()), для модели (CachingManager) или
+для чужой модели вроде User (cached(User)). Внутри транзакции, при
+select_for_update() и для таблиц вне QUERY_CACHE_TABLES выборка идёт
+мимо кэша: незафиксированные строки не должны попасть другим воркерам.
+"""
+import hashlib
+import re
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models
+from django.db.models.query import (
+    FlatValuesListIterable, ModelIterable, ValuesIterable,
+    ValuesListIterable
+)
+
+from .cache import bump, fetch, get_generations
+
+RESULT_KEY = 'query:{}'
+TABLE_SCOPE = 'table:{}'
+# Таблицы, которые читает запрос, - по FROM и JOIN в его SQL
+TABLES = re.compile(r'\b(?:FROM|JOIN)\s+["`]?(\w+)', re.IGNORECASE)
+WRITE = re.compile(
+    r'\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO|UPDATE|'
+    r'DELETE\s+FROM)\s+["`]?(\w+)',
+    re.IGNORECASE
+)
+# Результаты этих итераторов сериализуются; именованные кортежи
+# values_list(named=True) - динамические классы, их pickle не сохранит
+CACHEABLE_ITERABLES = (
+    ModelIterable, ValuesIterable, ValuesListIterable,
+    FlatValuesListIterable
+)
+
+
+def track_writes(execute, sql, params, many, context):
+    """Обёртка выполнения запросов: сдвигает поколение изменённой
+    таблицы сразу и, внутри транзакции, ещё раз после её фиксации."""
+    result = execute(sql, params, many, context)
+    match = WRITE.match(sql)
+    if match and match.group(1) in settings.QUERY_CACHE_TABLES:
+        _written(context['connection'], match.group(1))
+    return result
+
+
+def _written(connection, table):
+    scope = TABLE_SCOPE.format(table)
+    bump(scope)
+    if not connection.in_atomic_block:
+        return
+    # Список отложенных до COMMIT функций Django заменяет новым после
+    # фиксации и отката: по нему видно, что транзакция уже другая
+    hooks, tables = getattr(connection, 'query_cache_pending', (None, None))
+    if hooks is not connection.run_on_commit:
+        tables = set()
+        connection.query_cache_pending = (connection.run_on_commit, tables)
+    if table not in tables:
+        tables.add(table)
+        connection.on_commit(partial(bump, scope))
+
+
+def uncommitted(connection, table):
+    """Писала ли текущая транзакция соединения в таблицу."""
+    hooks, tables = getattr(connection, 'query_cache_pending', (None, ()))
+    return (
+        connection.in_atomic_block
+        and hooks is connection.run_on_commit
+        and table in tables
+    )
+
+
+def install(sender, connection, **kwargs):
+    """Подключает track_writes к новому соединению (connection_created)."""
+    if track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_writes)
+
+
+def _result_key(queryset, sql, params):
+    source = repr((
+        queryset.db, queryset._iterable_class.__name__, sql, params
+    ))
+    return RESULT_KEY.format(hashlib.md5(source.encode()).hexdigest())
+
+
+def cached_results(queryset, timeout):
+    """Строки выборки из кэша; None - выборка кэшу не подходит."""
+    connection = connections[queryset.db]
+    if (
+        connection.in_atomic_block
+        or queryset._for_write
+        or queryset.query.select_for_update
+        or queryset._iterable_class not in CACHEABLE_ITERABLES
+    ):
+        return None
+    try:
+        sql, params = queryset.query.chain().get_compiler(
+            queryset.db
+        ).as_sql()
+    except EmptyResultSet:
+        return None
+    tables = sorted(set(TABLES.findall(sql)))
+    if not tables or not set(tables) <= set(settings.QUERY_CACHE_TABLES):
+        return None
+    generations = get_generations(
+        [TABLE_SCOPE.format(table) for table in tables]
+    )
+    return fetch(
+        _result_key(queryset, sql, params),
+        lambda: list(queryset._iterable_class(queryset)),
+        timeout,
+        version=generations,
+        # Строки, прочитанные до последней записи в таблицы, не отдаются
+        # даже на время пересчёта
+        not_before=max(generations),
+    )
+
+
+class CachingQuerySet(models.QuerySet):
+    """QuerySet, выборки которого после .cached() идут через кэш."""
+
+    def cached(self, timeout=None):
+        clone = self._chain()
+        # Query копирует свои атрибуты при клонировании, поэтому
+        # filter(), order_by() и т. п. после cached() кэш не выключают
+        clone.query.cache_timeout = timeout or settings.QUERY_CACHE_TIMEOUT
+        return clone
+
+    def uncached(self):
+        clone = self._chain()
+        clone.query.cache_timeout = None
+        return clone
+
+    def _fetch_all(self):
+        timeout = getattr(self.query, 'cache_timeout', None)
+        if self._result_cache is None and timeout:
+            self._result_cache = cached_results(self, timeout)
+        super()._fetch_all()
+
+
+class CachingManager(models.Manager.from_queryset(CachingQuerySet)):
+    """Менеджер модели, все выборки которого идут через кэш."""
+
+    def get_queryset(self):
+        return super().get_queryset().cached()
+
+
+def cached(model, timeout=None):
+    """Выборка через кэш для модели со своим менеджером (например, User)."""
+    return CachingQuerySet(model).cached(timeout)
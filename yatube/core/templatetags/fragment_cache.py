@@ -0,0 +1,58 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.cache import fetch
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, spec):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.spec = spec
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        spec = self.spec.resolve(context)
+        template = context.template
+
+        def render():
+            if context.template is not None:
+                return self.nodelist.render(context)
+            # Обновление после ответа: шаблон уже отвязан от контекста
+            with context.render_context.push_state(template):
+                with context.bind_template(template):
+                    return self.nodelist.render(context)
+
+        return fetch(
+            make_template_fragment_key(self.name, [spec.key]),
+            render,
+            None if timeout is None else int(timeout),
+            version=spec.version,
+            not_before=spec.not_before,
+        )
+
+
+@register.tag
+def cache_fragment(parser, token):
+    """Как {% cache %}, но через core.cache.fetch: устаревший фрагмент
+    перерисовывает один воркер, остальные отдают прежний.
+
+    {% cache_fragment 3600 index_page cache_key %} ... {% endcache_fragment %}
+    cache_key - FragmentKey с ключом, версией и not_before.
+    """
+    nodelist = parser.parse(('endcache_fragment',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) != 4:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]} ожидает время жизни, имя фрагмента и ключ'
+        )
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        parser.compile_filter(tokens[3]),
+    )
@@ -0,0 +1,39 @@
+"""Запуск тестов с кэшем во временном каталоге.
+
+Тесты очищают кэш (cache.clear()) и пишут в журнал инвалидаций; в общем
+каталоге это задевало бы запущенный сервер разработки. Файловый L2 и
+журнал переносятся в каталог, который удаляется после прогона.
+"""
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+FILE_BACKEND = 'django.core.cache.backends.filebased.FileBasedCache'
+
+
+def isolate_caches():
+    """Переключает CACHES на новый временный каталог и возвращает его."""
+    directory = tempfile.mkdtemp(prefix='yatube_test_cache_')
+    caches = copy.deepcopy(settings.CACHES)
+    for alias, params in caches.items():
+        options = params.setdefault('OPTIONS', {})
+        if 'BUS' in options:
+            options['BUS'] = os.path.join(directory, 'invalidations.sqlite3')
+        if params['BACKEND'] == FILE_BACKEND:
+            params['LOCATION'] = os.path.join(directory, alias)
+    settings.CACHES = caches
+    return directory
+
+
+class IsolatedCacheRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        self.cache_dir = isolate_caches()
+        super().setup_test_environment(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
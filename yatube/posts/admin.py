@@ -1,9 +1,56 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.template.response import TemplateResponse
 
+from . import bulk, groups, search
 from .models import Post, Group, Comment, Follow
+from .paginators import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class GroupSelect(AutocompleteSelect):
+    """Выбор группы в строке списка постов.
+
+    Варианты подгружаются поиском, а выбранную группу виджет берёт из
+    снимка групп, а не отдельным запросом на каждую строку.
+    """
+
+    def optgroups(self, name, value, attr=None):
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for index, pk in enumerate(value, start=len(options)):
+            if str(pk) in self.choices.field.empty_values:
+                continue
+            group = groups.get_by_id(int(pk))
+            if group is not None:
+                options.append(self.create_option(
+                    name, pk, group.title, True, index, attrs=attr
+                ))
+        return [(None, options, 0)]
+
+
+class PostActionForm(helpers.ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, label='Группа',
+        empty_label='без группы'
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        groups.use_snapshot(self.fields['group'])
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без полного COUNT(*) таблицы и с приблизительным
+    числом строк за пределом ADMIN_EXACT_COUNT_LIMIT."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,12 +58,99 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group')
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
     empty_value_display = '-пусто-'
+    action_form = PostActionForm
+    actions = ('move_to_group', 'delete_in_batches')
+
+    def get_actions(self, request):
+        # Стандартное удаление загружает каждый пост и его комментарии
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def move_to_group(self, request, queryset):
+        try:
+            group = PostActionForm.base_fields['group'].clean(
+                request.POST.get('group')
+            )
+        except ValidationError:
+            self.message_user(
+                request, 'Выберите существующую группу', messages.ERROR
+            )
+            return None
+        moved = bulk.move_posts(queryset, group)
+        self.message_user(
+            request, f'Перенесено постов: {moved}, группа: {group or "нет"}'
+        )
+        return None
+    move_to_group.short_description = 'Перенести в группу'
+    move_to_group.allowed_permissions = ('change',)
+
+    def delete_in_batches(self, request, queryset):
+        if request.POST.get('post') != 'yes':
+            return TemplateResponse(
+                request,
+                'admin/posts/post/delete_in_batches.html',
+                {
+                    **self.admin_site.each_context(request),
+                    'opts': self.model._meta,
+                    'title': 'Удаление постов',
+                    'count': queryset.count(),
+                    'queryset': queryset[:20],
+                    'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+                    'select_across': request.POST.get('select_across'),
+                    'selected': request.POST.getlist(
+                        helpers.ACTION_CHECKBOX_NAME
+                    ),
+                }
+            )
+        deleted = bulk.delete_posts(queryset)
+        self.message_user(request, f'Удалено постов: {deleted}')
+        return None
+    delete_in_batches.short_description = 'Удалить выбранные посты'
+    delete_in_batches.allowed_permissions = ('delete',)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'group':
+            kwargs['widget'] = GroupSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using')
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тексту идёт через FTS5-индекс, а не LIKE '%...%'
+        if not search_term:
+            return queryset, False
+        return search.matching(queryset, search_term), False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
+
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    date_hierarchy = 'created'
+    raw_id_fields = ('author', 'post')
+
+
+class FollowAdmin(LargeTableAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,31 @@
+"""Авторы постов в кэше.
+
+Автор поста не меняется, поэтому ключ post_author:<id> хранится
+бессрочно: проверки прав и ключи страниц поста обходятся без запроса.
+"""
+from django.core.cache import cache
+
+from .models import Post
+
+POST_AUTHOR_KEY = 'post_author:{}'
+
+
+def post_author_id(post_id):
+    """Автор поста или None, если поста нет."""
+    key = POST_AUTHOR_KEY.format(post_id)
+    author_id = cache.get(key)
+    if author_id is None:
+        author_id = Post.objects.filter(pk=post_id).values_list(
+            'author_id', flat=True
+        ).first()
+        if author_id is not None:
+            cache.set(key, author_id, None)
+    return author_id
+
+
+def remember(post):
+    cache.set(POST_AUTHOR_KEY.format(post.pk), post.author_id, None)
+
+
+def forget(post_id):
+    cache.delete(POST_AUTHOR_KEY.format(post_id))
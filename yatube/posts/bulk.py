@@ -0,0 +1,135 @@
+"""Массовые операции с постами пакетами ограниченного размера.
+
+Каждый пакет - отдельная транзакция с одним UPDATE или DELETE по списку
+pk, поэтому большая операция не держит блокировку SQLite всё время,
+а прерванная оставляет согласованные данные. Сигналы по строкам не
+отправляются: счётчики, ссылки на картинки и поколения кэша сдвигаются
+один раз на пакет, поколения - ещё раз после его COMMIT. FTS5-индекс
+поиска поддерживают триггеры.
+"""
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import bump_on_commit
+
+from . import counters
+from .models import Comment, FeedEntry, Group, ImageBlob, Post, UserStats
+
+logger = logging.getLogger(__name__)
+
+
+def batches(queryset, batch_size=None):
+    """Отдаёт строки queryset пакетами по возрастанию pk.
+
+    Следующий пакет выбирается по pk > последнего, а не через OFFSET,
+    поэтому удалённые и перенесённые строки не сдвигают выборку.
+    """
+    batch_size = batch_size or settings.ADMIN_BATCH_SIZE
+    queryset = queryset.order_by('pk').values(
+        'pk', 'author_id', 'group_id', 'image'
+    )
+    last = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last)[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]['pk']
+
+
+def _scopes(rows, *group_ids):
+    scopes = {'index'}
+    for row in rows:
+        scopes.add(f'post:{row["pk"]}')
+        scopes.add(f'profile:{row["author_id"]}')
+    scopes.update(
+        f'group:{group_id}' for group_id in group_ids if group_id
+    )
+    return scopes
+
+
+def _shift_counts(model, counts, field):
+    for pk, count in counts.items():
+        if pk is not None:
+            counters.shift(model.objects.filter(pk=pk), **{field: count})
+
+
+def move_posts(queryset, group, batch_size=None, progress=None):
+    """Переносит посты в группу (или убирает из групп при group=None).
+
+    progress(done) вызывается после каждого пакета; возвращает число
+    перенесённых постов.
+    """
+    group_id = group.pk if group is not None else None
+    done = 0
+    for rows in batches(queryset.exclude(group_id=group_id), batch_size):
+        with transaction.atomic():
+            Post.objects.filter(
+                pk__in=[row['pk'] for row in rows]
+            ).update(group_id=group_id)
+            moved_from = Counter(row['group_id'] for row in rows)
+            _shift_counts(
+                Group,
+                {pk: -count for pk, count in moved_from.items()},
+                'posts_count'
+            )
+            _shift_counts(Group, {group_id: len(rows)}, 'posts_count')
+            bump_on_commit(*_scopes(rows, group_id, *moved_from))
+        done += len(rows)
+        logger.info('Перенесено постов: %s', done)
+        if progress is not None:
+            progress(done)
+    return done
+
+
+def delete_posts(queryset, batch_size=None, progress=None):
+    """Удаляет посты вместе с комментариями и записями лент.
+
+    Зависимые строки удаляются одним DELETE на таблицу, без загрузки
+    объектов сборщиком каскада. progress(done) вызывается после каждого
+    пакета; возвращает число удалённых постов.
+    """
+    done = 0
+    for rows in batches(queryset, batch_size):
+        pks = [row['pk'] for row in rows]
+        with transaction.atomic():
+            # _raw_delete - быстрое удаление Django без сборщика и
+            # сигналов; их работу делают счётчики ниже
+            Comment.objects.filter(post_id__in=pks)._raw_delete(
+                Comment.objects.db
+            )
+            FeedEntry.objects.filter(post_id__in=pks)._raw_delete(
+                FeedEntry.objects.db
+            )
+            Post.objects.filter(pk__in=pks)._raw_delete(Post.objects.db)
+            authors = Counter(row['author_id'] for row in rows)
+            _shift_counts(
+                UserStats,
+                {pk: -count for pk, count in authors.items()},
+                'posts_count'
+            )
+            groups = Counter(row['group_id'] for row in rows)
+            _shift_counts(
+                Group,
+                {pk: -count for pk, count in groups.items()},
+                'posts_count'
+            )
+            images = Counter(row['image'] for row in rows if row['image'])
+            _shift_counts(
+                ImageBlob,
+                {name: -count for name, count in images.items()},
+                'refs'
+            )
+            for name in images:
+                transaction.on_commit(
+                    lambda name=name: counters.collect_image(name)
+                )
+            bump_on_commit(*_scopes(rows, *groups))
+        done += len(rows)
+        logger.info('Удалено постов: %s', done)
+        if progress is not None:
+            progress(done)
+    return done
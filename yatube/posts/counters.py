@@ -0,0 +1,108 @@
+"""Денормализованные счётчики постов, комментариев, подписок и ссылок
+на файлы картинок.
+
+Счётчики сдвигаются одним UPDATE ... SET x = x + 1 через F(), поэтому
+параллельные запросы не теряют изменения. Массовые операции в обход
+сигналов (bulk_create, QuerySet.update) счётчики не трогают - расхождения
+исправляет команда reconcile_counters.
+"""
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import F
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import Follow, Group, ImageBlob, Post, UserStats
+
+
+def shift(queryset, **deltas):
+    """Атомарно сдвигает счётчики строк queryset на заданные величины."""
+    return queryset.update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def user_counts(user_id):
+    """Фактические значения счётчиков пользователя."""
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def shift_user(user_id, **deltas):
+    """Сдвигает счётчики пользователя; строка без счётчиков создаётся
+    по фактическим данным, уже учитывающим новую запись."""
+    if shift(UserStats.objects.filter(user_id=user_id), **deltas):
+        return
+    # Уменьшать нечего: строки нет или пользователь удаляется
+    if any(delta > 0 for delta in deltas.values()):
+        UserStats.objects.get_or_create(
+            user_id=user_id, defaults=user_counts(user_id)
+        )
+
+
+def shift_group(group_id, delta):
+    if group_id is not None:
+        shift(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def stats_for(user):
+    """Счётчики пользователя для страниц; при отсутствии строки она
+    однократно заполняется фактическими значениями."""
+    stats = UserStats.objects.filter(user=user).first()
+    if stats is None:
+        stats, _ = UserStats.objects.get_or_create(
+            user=user, defaults=user_counts(user.pk)
+        )
+    return stats
+
+
+def retain_image(name):
+    """Добавляет ссылку поста на файл картинки."""
+    if not shift(ImageBlob.objects.filter(name=name), refs=1):
+        ImageBlob.objects.get_or_create(
+            name=name,
+            defaults={'refs': Post.objects.filter(image=name).count()},
+        )
+
+
+def lock_image(name):
+    """Блокирует запись ImageBlob файла до конца транзакции.
+
+    Под этой блокировкой collect_image удаляет файл без ссылок, а
+    хранилище проверяет, есть ли уже файл с таким содержимым: загрузка
+    либо увидит, что файл удалён, и запишет его заново, либо успеет
+    добавить ссылку раньше, чем его проверит collect_image. UPDATE
+    берёт блокировку записи и в SQLite, где select_for_update() ничего
+    не делает.
+    """
+    shift(ImageBlob.objects.filter(name=name), refs=0)
+
+
+def release_image(name):
+    """Снимает ссылку; файл без ссылок удаляется после фиксации."""
+    shift(ImageBlob.objects.filter(name=name), refs=-1)
+    transaction.on_commit(lambda: collect_image(name))
+
+
+def collect_image(name):
+    """Удаляет файл картинки и её миниатюры, если ссылок не осталось.
+
+    Проверка ссылок одним DELETE и удаление файла - в одной транзакции,
+    под блокировкой записи ImageBlob (см. lock_image).
+    """
+    with transaction.atomic():
+        orphan = ImageBlob.objects.filter(name=name, refs__lte=0)
+        if not orphan.delete()[0]:
+            return
+        image = Post._meta.get_field('image')
+        # Миниатюры удаляются вместе с записями о них в хранилище ключей
+        # sorl
+        default.kvstore.delete(ImageFile(name, image.storage))
+        try:
+            image.storage.delete(name)
+        except SuspiciousFileOperation:
+            # Путь вне MEDIA_ROOT хранилищу не принадлежит - не трогаем
+            pass
@@ -0,0 +1,294 @@
+"""Материализованная лента подписок (fan-out on write).
+
+При публикации пост раскладывается в FeedEntry каждого подписчика автора,
+поэтому страница /follow/ читает одну таблицу по индексу (user, pub_date)
+вместо join Post-Follow с сортировкой.
+
+Авторы, у которых подписчиков больше FEED_FANOUT_THRESHOLD, не
+раскладываются по лентам: их последние FEED_DEPTH постов подтягиваются
+при чтении и сливаются с разложенными записями по pub_date (гибридная
+схема push/pull). Автор, опустившийся до порога, раскладывает свои посты
+по лентам подписчиков (demote). После изменения порога ленты стоит
+пересобрать командой rebuild_feed.
+"""
+import heapq
+import logging
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import FeedEntry, Follow, Post, UserStats
+
+CELEBRITIES_KEY = 'feed:celebrities'
+# Сколько лент проверяется на переполнение одним запросом
+TRIM_BATCH_SIZE = 500
+# Счётчик запросов /follow/, обслуженных путём push, pull или hybrid, -
+# в общем кэше, чтобы команда feed_stats видела сумму по всем воркерам
+FEED_PATH_KEY = 'feed:path:{}'
+FEED_PATHS = ('push', 'pull', 'hybrid')
+
+logger = logging.getLogger(__name__)
+
+
+def celebrity_ids():
+    """Авторы с числом подписчиков выше порога; кэшируется на
+    FEED_CELEBRITIES_TIMEOUT секунд, чтобы запись и чтение ленты
+    одинаково решали, какой путь у автора."""
+    ids = cache.get(CELEBRITIES_KEY)
+    if ids is None:
+        ids = frozenset(
+            UserStats.objects.filter(
+                followers_count__gt=settings.FEED_FANOUT_THRESHOLD
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(
+            CELEBRITIES_KEY, ids, settings.FEED_CELEBRITIES_TIMEOUT
+        )
+    return ids
+
+
+def _entries(user_ids, posts):
+    return [
+        FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in user_ids
+        for post_id, pub_date in posts
+    ]
+
+
+def overfull(user_ids):
+    """Пользователи, в лентах которых больше FEED_DEPTH записей: один
+    сгруппированный запрос на TRIM_BATCH_SIZE лент."""
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), TRIM_BATCH_SIZE):
+        yield from (
+            FeedEntry.objects
+            .filter(user_id__in=user_ids[start:start + TRIM_BATCH_SIZE])
+            .order_by()
+            .values('user_id')
+            .annotate(entries=Count('pk'))
+            .filter(entries__gt=settings.FEED_DEPTH)
+            .values_list('user_id', flat=True)
+        )
+
+
+def trim(user_ids):
+    """Обрезает ленты пользователей до FEED_DEPTH последних записей.
+
+    Запросы на обрезку идут только к переполненным лентам.
+    """
+    depth = settings.FEED_DEPTH
+    for user_id in list(overfull(user_ids)):
+        entries = FeedEntry.objects.filter(user_id=user_id)
+        cutoff = entries.values_list('pub_date', 'post_id')[depth:depth + 1]
+        for pub_date, post_id in cutoff:
+            entries.filter(pub_date__lte=pub_date).exclude(
+                pub_date=pub_date, post_id__gt=post_id
+            ).delete()
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if post.author_id in celebrity_ids():
+        return
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    FeedEntry.objects.bulk_create(
+        _entries(follower_ids, [(post.pk, post.pub_date)]),
+        ignore_conflicts=True,
+    )
+    trim(follower_ids)
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту подписчика последними постами нового автора."""
+    if author_id in celebrity_ids():
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.FEED_DEPTH]
+    FeedEntry.objects.bulk_create(
+        _entries([user_id], posts), ignore_conflicts=True
+    )
+    trim([user_id])
+
+
+def demote(author_id):
+    """Автор опустился до порога: его посты снова раскладываются, а
+    написанные, пока их подтягивали при чтении, добавляются в ленты
+    подписчиков - иначе они пропали бы из лент вместе с путём pull.
+
+    Вызывается после уменьшения счётчика подписчиков; автор опустился,
+    если счётчик стал ровно FEED_FANOUT_THRESHOLD.
+    """
+    followers = UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if followers != settings.FEED_FANOUT_THRESHOLD:
+        return
+    # Запись и чтение лент должны сразу перестать считать автора
+    # популярным
+    cache.delete(CELEBRITIES_KEY)
+    follower_ids = list(
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+    )
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.FEED_DEPTH]
+    FeedEntry.objects.bulk_create(
+        _entries(follower_ids, posts),
+        batch_size=TRIM_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim(follower_ids)
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты подписчика посты автора, от которого он отписался."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user_id):
+    """Пересобирает ленту пользователя с нуля по его подпискам."""
+    posts = Post.objects.filter(author__following__user_id=user_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.FEED_DEPTH]
+    with transaction.atomic():
+        FeedEntry.objects.filter(user_id=user_id).delete()
+        FeedEntry.objects.bulk_create(_entries([user_id], posts))
+
+
+def entries_for(user):
+    """Записи ленты пользователя вместе с постами, авторами и группами."""
+    return FeedEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    )
+
+
+class HybridFeed:
+    """Лента как слияние нескольких отсортированных источников.
+
+    Источники - querysets с полями pub_date и post_id; срез берёт первые
+    stop строк каждого источника и сливает их по ключу (pub_date, post_id).
+    Поддерживает то, что нужно Paginator и CursorPaginator: count(),
+    срезы, filter() и order_by().
+    """
+
+    ordered = True
+
+    def __init__(self, sources, served=None, descending=True):
+        self.sources = sources
+        # Общий для клонов набор источников, давших строки странице
+        self.served = set() if served is None else served
+        self.descending = descending
+
+    def _clone(self, sources, descending=None):
+        if descending is None:
+            descending = self.descending
+        return HybridFeed(sources, self.served, descending)
+
+    def filter(self, *args, **kwargs):
+        return self._clone({
+            name: queryset.filter(*args, **kwargs)
+            for name, queryset in self.sources.items()
+        })
+
+    def order_by(self, *fields):
+        return self._clone(
+            {
+                name: queryset.order_by(*fields)
+                for name, queryset in self.sources.items()
+            },
+            descending=fields[0].startswith('-'),
+        )
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.sources.values())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        runs = [
+            [(name, row) for row in queryset[:index.stop]]
+            for name, queryset in self.sources.items()
+        ]
+        merged = heapq.merge(
+            *runs,
+            key=lambda item: (item[1].pub_date, item[1].post_id),
+            reverse=self.descending,
+        )
+        rows = list(islice(merged, index.start or 0, index.stop))
+        self.served.update(name for name, _ in rows)
+        return [
+            row if isinstance(row, FeedEntry)
+            else FeedEntry(post=row, pub_date=row.pub_date)
+            for _, row in rows
+        ]
+
+
+def feed_for(user):
+    """Источник ленты пользователя: разложенные записи плюс посты
+    популярных авторов, которые читаются напрямую из Post."""
+    pushed = entries_for(user)
+    celebrities = celebrity_ids()
+    if celebrities:
+        celebrities = list(
+            Follow.objects.filter(user=user, author_id__in=celebrities)
+            .values_list('author_id', flat=True)
+        )
+    if not celebrities:
+        return pushed
+    pulled = Post.objects.filter(author_id__in=celebrities)
+    # Как и разложенная часть, подтягиваемая не глубже FEED_DEPTH постов:
+    # срезы HybridFeed читают каждый источник с начала
+    depth = settings.FEED_DEPTH
+    oldest = pulled.order_by('-pub_date', '-id').values_list(
+        'pub_date', flat=True
+    )[depth - 1:depth].first()
+    if oldest is not None:
+        pulled = pulled.filter(pub_date__gte=oldest)
+    pulled = pulled.annotate(post_id=F('id')).select_related(
+        'author', 'group'
+    ).order_by('-pub_date', '-post_id')
+    return HybridFeed({
+        'push': pushed.exclude(post__author_id__in=celebrities),
+        'pull': pulled,
+    })
+
+
+def record_path(source):
+    """Учитывает, какой путь обслужил запрос, и возвращает его имя."""
+    served = getattr(source, 'served', None) or {'push'}
+    path = 'hybrid' if len(served) > 1 else next(iter(served))
+    key = FEED_PATH_KEY.format(path)
+    cache.add(key, 0, None)
+    cache.incr(key)
+    logger.debug('Лента подписок отдана путём %s', path)
+    return path
+
+
+def path_counts():
+    """Сколько запросов ленты обслужил каждый путь."""
+    keys = {path: FEED_PATH_KEY.format(path) for path in FEED_PATHS}
+    found = cache.get_many(keys.values())
+    return {path: found.get(key, 0) for path, key in keys.items()}
+
+
+def reset_path_counts():
+    cache.delete_many([FEED_PATH_KEY.format(path) for path in FEED_PATHS])
+
+
+def as_posts(page_obj):
+    """Заменяет записи ленты на странице самими постами."""
+    page_obj.object_list = [entry.post for entry in page_obj.object_list]
+    return page_obj
@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from . import groups
+from .ingest import ingest
 from .models import Post, Comment
 
 
@@ -16,6 +19,17 @@ class PostForm(forms.ModelForm):
             'group': 'Группа, к которой будет относиться пост',
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        groups.use_snapshot(self.fields['group'])
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Уже сохранённая картинка при редактировании не перекодируется
+        if isinstance(image, UploadedFile):
+            return ingest(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,104 @@
+"""Снимок групп в памяти процесса.
+
+Групп мало, и меняются они редко, поэтому поиск по slug на странице
+группы, список групп в форме поста и названия групп в админке берутся из
+неизменяемого снимка, а не из базы. Сигналы сохранения и удаления группы
+сбрасывают снимок своего процесса сразу и сдвигают поколение 'groups',
+чем сбрасывают снимки остальных процессов. Следующее обращение строит
+снимок заново одним запросом. Счётчик постов группы меняется update() на
+каждый пост и снимок не сбрасывает - posts_count в снимке не читать.
+Запись в группы через update() или SQL должна сама вызвать bump('groups').
+
+Транзакция, которая сама писала в таблицу групп, держит свой снимок на
+соединении: общий не должен увидеть группы, которые потом откатятся.
+Группы снимка общие для всех запросов процесса - их нельзя изменять.
+"""
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.db import connection
+from django.forms.models import ModelChoiceIterator
+
+from core.cache import get_generations
+from core.querycache import uncommitted
+
+from .models import Group
+
+Snapshot = namedtuple('Snapshot', 'generation ordered by_id by_slug')
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def _build(generation):
+    ordered = tuple(Group.objects.uncached().order_by('title'))
+    return Snapshot(
+        generation,
+        ordered,
+        MappingProxyType({group.pk: group for group in ordered}),
+        MappingProxyType({group.slug: group for group in ordered}),
+    )
+
+
+def _transaction_snapshot(generation):
+    current = getattr(connection, 'group_snapshot', None)
+    if current is None or current.generation != generation:
+        current = connection.group_snapshot = _build(generation)
+    return current
+
+
+def snapshot():
+    """Текущий снимок групп; устаревший строится заново."""
+    global _snapshot
+    generation, = get_generations(('groups',))
+    if uncommitted(connection, Group._meta.db_table):
+        return _transaction_snapshot(generation)
+    current = _snapshot
+    if current is not None and current.generation == generation:
+        return current
+    with _lock:
+        if _snapshot is None or _snapshot.generation != generation:
+            _snapshot = _build(generation)
+        return _snapshot
+
+
+def invalidate():
+    global _snapshot
+    _snapshot = None
+
+
+def ordered():
+    """Все группы по названию."""
+    return snapshot().ordered
+
+
+def get_by_slug(slug):
+    return snapshot().by_slug.get(slug)
+
+
+def get_by_id(pk):
+    return snapshot().by_id.get(pk)
+
+
+class GroupChoiceIterator(ModelChoiceIterator):
+    """Варианты поля выбора группы из снимка, без запроса к базе."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for group in ordered():
+            yield self.choice(group)
+
+    def __len__(self):
+        return len(ordered()) + (self.field.empty_label is not None)
+
+
+def use_snapshot(field):
+    """Переключает поле выбора группы на варианты из снимка.
+
+    Виджет получил свои варианты при копировании поля в форму, поэтому
+    их нужно заменить вместе с итератором поля.
+    """
+    field.iterator = GroupChoiceIterator
+    field.widget.choices = field.choices
@@ -0,0 +1,129 @@
+"""Приём картинок постов.
+
+Загрузка пишется во временный файл (FILE_UPLOAD_HANDLERS), затем до
+полного декодирования проверяются размер файла и число пикселей по
+заголовку. Картинка поворачивается по EXIF, уменьшается до
+POST_IMAGE_MAX_SIDE и перекодируется без метаданных: фото - в
+прогрессивный JPEG, картинки с прозрачностью - в PNG, GIF остаётся GIF
+со всеми кадрами. Так размер и стоимость декодирования картинки поста
+предсказуемы для всех следующих проходов миниатюр.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps, ImageSequence
+
+FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'PNG': ('.png', 'image/png'),
+    'GIF': ('.gif', 'image/gif'),
+}
+
+# Ключи Image.info, которые PNG и GIF writer Pillow переносят в файл
+METADATA = ('exif', 'comment', 'extension', 'xmp', 'XML:com.adobe.xmp')
+
+
+def strip(frame):
+    """Убирает из кадра метаданные, чтобы их не записал писатель."""
+    for key in METADATA:
+        frame.info.pop(key, None)
+    return frame
+
+
+def target_format(image):
+    if image.format == 'GIF':
+        return 'GIF'
+    if image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    ):
+        return 'PNG'
+    return 'JPEG'
+
+
+def check_size(upload):
+    max_bytes = settings.POST_IMAGE_MAX_BYTES
+    if upload.size > max_bytes:
+        raise ValidationError(
+            'Файл больше %(size)d МБ.',
+            code='file_too_large',
+            params={'size': max_bytes // (1024 * 1024)},
+        )
+
+
+def check_pixels(image):
+    """Проверяет число пикселей по заголовку, до декодирования."""
+    width, height = image.size
+    pixels = width * height * getattr(image, 'n_frames', 1)
+    if pixels > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большое изображение: %(width)d×%(height)d.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def prepare(frame, fmt):
+    """Поворачивает кадр по EXIF, вписывает в POST_IMAGE_MAX_SIDE и
+    убирает метаданные."""
+    frame = ImageOps.exif_transpose(frame)
+    if fmt == 'JPEG' and frame.mode != 'RGB':
+        frame = frame.convert('RGB')
+    elif fmt == 'PNG' and frame.mode not in ('RGBA', 'LA'):
+        frame = frame.convert('RGBA')
+    side = settings.POST_IMAGE_MAX_SIDE
+    frame.thumbnail((side, side), Image.LANCZOS)
+    return strip(frame)
+
+
+def encode(image, fmt, output):
+    side = settings.POST_IMAGE_MAX_SIDE
+    if fmt == 'GIF':
+        frames = [
+            ImageOps.exif_transpose(frame.copy())
+            for frame in ImageSequence.Iterator(image)
+        ]
+        for frame in frames:
+            frame.thumbnail((side, side), Image.LANCZOS)
+            strip(frame)
+        options = {'save_all': True, 'optimize': True}
+        for key in ('duration', 'loop', 'disposal', 'transparency'):
+            if key in image.info:
+                options[key] = image.info[key]
+        frames[0].save(
+            output, 'GIF', append_images=frames[1:], **options
+        )
+    elif fmt == 'JPEG':
+        image.draft('RGB', (side, side))
+        prepare(image, fmt).save(
+            output, 'JPEG', quality=settings.POST_IMAGE_QUALITY,
+            optimize=True, progressive=True,
+        )
+    else:
+        prepare(image, fmt).save(output, 'PNG', optimize=True)
+
+
+def ingest(upload):
+    """Возвращает перекодированную копию загруженной картинки."""
+    check_size(upload)
+    upload.seek(0)
+    with Image.open(upload) as image:
+        check_pixels(image)
+        fmt = target_format(image)
+        output = tempfile.TemporaryFile()
+        try:
+            encode(image, fmt, output)
+        except (OSError, ValueError) as error:
+            output.close()
+            raise ValidationError(
+                'Не удалось обработать изображение.', code='invalid_image'
+            ) from error
+    extension, content_type = FORMATS[fmt]
+    name = os.path.splitext(os.path.basename(upload.name))[0] + extension
+    size = output.tell()
+    output.seek(0)
+    return UploadedFile(
+        output, name=name, content_type=content_type, size=size
+    )
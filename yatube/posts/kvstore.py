@@ -0,0 +1,60 @@
+"""Хранилище ключей sorl с пакетным чтением и LRU процесса.
+
+Каждый тег {% thumbnail %} читает метаданные миниатюры по отдельности:
+кэш, а при промахе - строку thumbnail_kvstore. Страница ленты заранее
+вызывает prefetch для ключей всех своих картинок: LRU процесса, затем один
+get_many к общему кэшу и один запрос к базе для оставшихся. После этого
+теги страницы читают метаданные из LRU без обращений к кэшу и базе.
+"""
+from django.conf import settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.cache import LRUCache
+
+# Метаданные готовых миниатюр; отсутствие миниатюры здесь не хранится,
+# чтобы построенная воркером миниатюра сразу появилась на страницах
+local = LRUCache(settings.THUMBNAIL_LRU_SIZE, settings.THUMBNAIL_LRU_TIMEOUT)
+
+
+class KVStore(CachedDBStore):
+
+    def prefetch(self, keys):
+        """Загружает значения ключей одним get_many и одним запросом."""
+        keys = [key for key in dict.fromkeys(keys) if local.get(key) is None]
+        if not keys:
+            return
+        found = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            loaded = dict(
+                KVStoreModel.objects.filter(key__in=missing)
+                .values_list('key', 'value')
+            )
+            fetched = {key: loaded.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(
+                fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            found.update(fetched)
+        for key, value in found.items():
+            if value != EMPTY_VALUE:
+                local.set(key, value)
+
+    def _get_raw(self, key):
+        value = local.get(key)
+        if value is None:
+            value = super()._get_raw(key)
+            if value is not None:
+                local.set(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        local.set(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        for key in keys:
+            local.delete(key)
@@ -0,0 +1,152 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+
+from posts.models import Comment, Follow, Post
+
+# Схема до и после составных индексов и уникальности подписок
+STATES = (
+    ('до', ('posts', '0008_feedentry')),
+    ('после', ('posts', '0009_feed_indexes')),
+)
+
+
+def hot_queries(alias, author_id, group_id, user_id, post_id):
+    """Самые частые запросы лент; выбираются только неизменные колонки,
+    чтобы запросы работали на схеме любой из сравниваемых миграций."""
+    return (
+        (
+            'Профиль: посты автора по дате',
+            Post.objects.using(alias).filter(author_id=author_id)
+            .order_by('-pub_date').values_list('id', flat=True)[:10],
+        ),
+        (
+            'Группа: посты группы по дате',
+            Post.objects.using(alias).filter(group_id=group_id)
+            .order_by('-pub_date').values_list('id', flat=True)[:10],
+        ),
+        (
+            'Проверка подписки (user, author)',
+            Follow.objects.using(alias).filter(
+                user_id=user_id, author_id=author_id
+            ).values_list('id', flat=True)[:1],
+        ),
+        (
+            'Комментарии поста по времени',
+            Comment.objects.using(alias).filter(post_id=post_id)
+            .order_by('created').values_list('id', flat=True)[:20],
+        ),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает планы и время горячих запросов лент до и после '
+        'составных индексов на SQLite-базах в памяти с одинаковыми данными'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок на одного пользователя')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        results = []
+        for label, target in STATES:
+            alias = f'bench_{target[1]}'
+            connections.databases[alias] = {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': ':memory:',
+            }
+            try:
+                results.append((label, self.measure(alias, target, options)))
+            finally:
+                connections[alias].close()
+                del connections[alias]
+                del connections.databases[alias]
+        for index, (title, _, _) in enumerate(results[0][1]):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            for label, rows in results:
+                _, plan, elapsed = rows[index]
+                self.stdout.write(f'  {label:6} {elapsed:8.3f} мс  {plan}')
+
+    def measure(self, alias, target, options):
+        connection = connections[alias]
+        executor = MigrationExecutor(connection)
+        executor.migrate([*executor.loader.graph.leaf_nodes('auth'), target])
+        ids = self.seed(connection, options)
+        results = []
+        with connection.cursor() as cursor:
+            for title, queryset in hot_queries(alias, *ids):
+                sql, params = queryset.query.get_compiler(
+                    using=alias
+                ).as_sql()
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = '; '.join(row[-1] for row in cursor.fetchall())
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                elapsed = (
+                    (time.perf_counter() - started) * 1000 / options['repeat']
+                )
+                results.append((title, plan, elapsed))
+        return results
+
+    def seed(self, connection, options):
+        """Заполняет базу одинаковыми для всех схем данными."""
+        rng = random.Random(0)
+        users = options['users']
+        groups = options['groups']
+        posts = options['posts']
+        date = '2023-01-01 00:00:{:02d}.{:06d}'
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO auth_user (id, password, is_superuser, '
+                'username, first_name, last_name, email, is_staff, '
+                'is_active, date_joined) VALUES (%s, %s, 0, %s, %s, %s, '
+                '%s, 0, 1, %s)',
+                [(i, '', f'user{i}', '', '', '', date.format(0, 0))
+                 for i in range(1, users + 1)]
+            )
+            cursor.executemany(
+                'INSERT INTO posts_group (id, title, slug, description) '
+                'VALUES (%s, %s, %s, %s)',
+                [(i, f'Группа {i}', f'group-{i}', '')
+                 for i in range(1, groups + 1)]
+            )
+            cursor.executemany(
+                'INSERT INTO posts_post (id, text, pub_date, author_id, '
+                'group_id, image) VALUES (%s, %s, %s, %s, %s, %s)',
+                [(i, f'Пост {i}', date.format(i % 60, i),
+                  rng.randint(1, users), rng.choice([None, rng.randint(
+                      1, groups)]), '')
+                 for i in range(1, posts + 1)]
+            )
+            cursor.executemany(
+                'INSERT INTO posts_comment (text, created, author_id, '
+                'post_id) VALUES (%s, %s, %s, %s)',
+                [('Комментарий', date.format(i % 60, i),
+                  rng.randint(1, users), rng.randint(1, posts))
+                 for i in range(1, options['comments'] + 1)]
+            )
+            cursor.executemany(
+                'INSERT INTO posts_follow (user_id, author_id) '
+                'VALUES (%s, %s)',
+                [(user_id, author_id)
+                 for user_id in range(1, users + 1)
+                 for author_id in rng.sample(
+                     range(1, users + 1), min(options['follows'], users))]
+            )
+            cursor.execute('ANALYZE')
+        return (
+            rng.randint(1, users), rng.randint(1, groups),
+            rng.randint(1, users), rng.randint(1, posts),
+        )
@@ -0,0 +1,122 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+
+from posts.models import Group, Post, User
+from posts.rows import post_rows
+
+
+def touch(post):
+    """Читает у поста всё, что показывает карточка ленты."""
+    author = post.author
+    group = post.group
+    return (
+        post.pk, post.text, post.pub_date, post.image.name,
+        author.username, author.get_full_name(),
+        group and (group.title, group.slug),
+    )
+
+
+def model_page(alias, offset, size):
+    return list(
+        Post.objects.using(alias).select_related('author', 'group')
+        .order_by('-pub_date', '-id')[offset:offset + size]
+    )
+
+
+def row_page(alias, offset, size):
+    return list(post_rows(
+        Post.objects.using(alias).order_by('-pub_date', '-id')
+    )[offset:offset + size])
+
+
+PATHS = (
+    ('Post + select_related', model_page),
+    ('PostRow', row_page),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает выборку страницы ленты моделями Post и строками '
+        'PostRow: время и память на страницу, SQLite-база в памяти'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--pages', type=int, default=500)
+
+    def handle(self, *args, **options):
+        alias = 'bench_rows'
+        connections.databases[alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+        try:
+            self.prepare(alias, options)
+            for title, page in PATHS:
+                elapsed, peak = self.measure(alias, page, options)
+                self.stdout.write(
+                    f'{title:24} {elapsed:8.3f} мс/стр.  '
+                    f'{peak / 1024:8.1f} КиБ пик памяти'
+                )
+        finally:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+
+    def prepare(self, alias, options):
+        connection = connections[alias]
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        rng = random.Random(0)
+        User.objects.using(alias).bulk_create(
+            User(username=f'user{i}', first_name='Имя', last_name=f'{i}')
+            for i in range(options['users'])
+        )
+        Group.objects.using(alias).bulk_create(
+            Group(title=f'Группа {i}', slug=f'group-{i}')
+            for i in range(options['groups'])
+        )
+        # bulk_create на SQLite не возвращает pk - их берут из базы
+        users = list(User.objects.using(alias).values_list('pk', flat=True))
+        groups = list(Group.objects.using(alias).values_list('pk', flat=True))
+        Post.objects.using(alias).bulk_create(
+            (
+                Post(
+                    author_id=rng.choice(users),
+                    group_id=rng.choice([None, rng.choice(groups)]),
+                    text=f'Пост {i} ' * 20,
+                )
+                for i in range(options['posts'])
+            ),
+            batch_size=500,
+        )
+
+    def measure(self, alias, page, options):
+        size = options['page_size']
+        offsets = [
+            (number * size) % max(options['posts'] - size, 1)
+            for number in range(options['pages'])
+        ]
+        started = time.perf_counter()
+        for offset in offsets:
+            for post in page(alias, offset, size):
+                touch(post)
+        elapsed = (time.perf_counter() - started) * 1000 / len(offsets)
+        # Пик памяти одной страницы - отдельным проходом: tracemalloc
+        # замедляет выполнение
+        tracemalloc.start()
+        posts = page(alias, 0, size)
+        for post in posts:
+            touch(post)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak
@@ -0,0 +1,99 @@
+import hashlib
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import ImageBlob, Post
+from posts.storage import digest_name
+from posts.thumbnails import refresh_pages
+
+
+def file_digest(storage, name):
+    digest = hashlib.sha256()
+    with storage.open(name) as file:
+        for chunk in file.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в адресуемое по содержимому хранилище: '
+        'одинаковые файлы сливаются в один, посты ссылаются на него'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет сделано'
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = (
+            Post.objects.exclude(image='').order_by()
+            .values_list('image', flat=True).distinct()
+        )
+        moved = merged = 0
+        for name in list(names):
+            if not storage.exists(name):
+                self.stderr.write(f'Нет файла: {name}')
+                continue
+            target = digest_name(
+                os.path.dirname(os.path.dirname(name))
+                if self.is_addressed(name) else os.path.dirname(name),
+                file_digest(storage, name),
+                os.path.splitext(name)[1].lower(),
+            )
+            if target == name:
+                continue
+            duplicate = storage.exists(target)
+            self.stdout.write(
+                f'{name} -> {target}' + (' (дубликат)' if duplicate else '')
+            )
+            if options['dry_run']:
+                continue
+            if duplicate:
+                merged += 1
+            else:
+                os.makedirs(
+                    os.path.dirname(storage.path(target)), exist_ok=True
+                )
+                os.replace(storage.path(name), storage.path(target))
+                moved += 1
+            with transaction.atomic():
+                Post.objects.filter(image=name).update(image=target)
+            default.kvstore.delete(ImageFile(name, storage))
+            if duplicate:
+                storage.delete(name)
+            refresh_pages(target)
+        if not options['dry_run']:
+            self.count_refs()
+        self.stdout.write(
+            f'Перенесено файлов: {moved}, слито дубликатов: {merged}'
+        )
+
+    @staticmethod
+    def is_addressed(name):
+        stem = os.path.splitext(os.path.basename(name))[0]
+        return (
+            len(stem) == 64
+            and os.path.basename(os.path.dirname(name)) == stem[:2]
+        )
+
+    def count_refs(self):
+        """Пересчитывает ссылки на файлы: посты менялись через update()."""
+        refs = (
+            Post.objects.exclude(image='').values_list('image')
+            .annotate(refs=Count('pk')).order_by()
+        )
+        with transaction.atomic():
+            ImageBlob.objects.all().delete()
+            ImageBlob.objects.bulk_create(
+                [ImageBlob(name=name, refs=total) for name, total in refs],
+                batch_size=500,
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = 'Показывает, сколько запросов ленты обслужил каждый путь'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить счётчики'
+        )
+
+    def handle(self, *args, **options):
+        counts = feed.path_counts()
+        total = sum(counts.values())
+        for path, count in counts.items():
+            share = count / total * 100 if total else 0
+            self.stdout.write(f'{path:7} {count:10} {share:6.1f}%')
+        if options['reset']:
+            feed.reset_path_counts()
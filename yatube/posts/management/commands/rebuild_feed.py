@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import feed
+from posts.models import FeedEntry, Follow, User
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пользователи, чьи ленты нужно пересобрать (по умолчанию все)'
+        )
+
+    def handle(self, *args, **options):
+        usernames = set(options['usernames'])
+        if usernames:
+            user_ids = set(
+                User.objects.filter(username__in=usernames)
+                .values_list('id', flat=True)
+            )
+            if len(user_ids) != len(usernames):
+                raise CommandError('Часть пользователей не найдена')
+        else:
+            # Ленты без подписок тоже пересобираем: они должны опустеть
+            user_ids = set(
+                Follow.objects.values_list('user_id', flat=True)
+            ) | set(
+                FeedEntry.objects.values_list('user_id', flat=True)
+            )
+        for user_id in sorted(user_ids):
+            feed.rebuild(user_id)
+        self.stdout.write(f'Пересобрано лент: {len(user_ids)}')
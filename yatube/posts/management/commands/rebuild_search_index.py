@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError('Индекс FTS5 есть только у SQLite')
+        search.rebuild()
+        self.stdout.write('Индекс поиска пересобран')
@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+def related_count(model, field):
+    """Подзапрос COUNT связанных строк для каждой строки внешнего запроса."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def batches(queryset, size):
+    """Идёт по queryset пачками по первичному ключу, без OFFSET."""
+    last_pk = None
+    while True:
+        page = queryset.order_by('pk')
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        rows = list(page[:size])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1].pk
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет денормализованные счётчики с фактическими данными '
+        'и исправляет расхождения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        size = options['batch_size']
+        fixed = {
+            'пользователи': self.reconcile_users(size),
+            'группы': self.reconcile(
+                # Сверка читает таблицы в обход кэша выборок
+                Group.objects.uncached().annotate(
+                    actual=related_count(Post, 'group')
+                ), 'posts_count', size
+            ),
+            'посты': self.reconcile(
+                Post.objects.annotate(
+                    actual=related_count(Comment, 'post')
+                ), 'comments_count', size
+            ),
+        }
+        for title, count in fixed.items():
+            self.stdout.write(f'{title}: исправлено {count}')
+
+    def reconcile(self, queryset, field, size):
+        fixed = 0
+        for rows in batches(queryset.only('pk', field), size):
+            drifted = [
+                row for row in rows if getattr(row, field) != row.actual
+            ]
+            for row in drifted:
+                setattr(row, field, row.actual)
+            with transaction.atomic():
+                type(rows[0]).objects.bulk_update(drifted, [field])
+            fixed += len(drifted)
+        return fixed
+
+    def reconcile_users(self, size):
+        fields = ('posts_count', 'followers_count', 'following_count')
+        users = User.objects.annotate(
+            posts_count=related_count(Post, 'author'),
+            followers_count=related_count(Follow, 'author'),
+            following_count=related_count(Follow, 'user'),
+        ).only('pk')
+        fixed = 0
+        for rows in batches(users, size):
+            stored = UserStats.objects.in_bulk([row.pk for row in rows])
+            missing, drifted = [], []
+            for row in rows:
+                actual = {field: getattr(row, field) for field in fields}
+                stats = stored.get(row.pk)
+                if stats is None:
+                    missing.append(UserStats(user_id=row.pk, **actual))
+                elif any(getattr(stats, f) != v for f, v in actual.items()):
+                    for field, value in actual.items():
+                        setattr(stats, field, value)
+                    drifted.append(stats)
+            with transaction.atomic():
+                UserStats.objects.bulk_create(missing, ignore_conflicts=True)
+                UserStats.objects.bulk_update(drifted, fields)
+            fixed += len(missing) + len(drifted)
+        return fixed
@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import ThumbnailJob
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры из очереди ThumbnailJob пулом потоков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Размер пула; 0 - строить в текущем потоке'
+        )
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        pool = None
+        if options['workers']:
+            pool = ThreadPoolExecutor(
+                max_workers=options['workers'],
+                thread_name_prefix='thumbnails',
+            )
+        done = 0
+        try:
+            while True:
+                jobs = list(
+                    ThumbnailJob.objects.all()[:options['batch_size']]
+                )
+                if jobs and pool is not None:
+                    list(pool.map(thumbnails.work, jobs))
+                else:
+                    for job in jobs:
+                        thumbnails.generate(job)
+                done += len(jobs)
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(f'Построено миниатюр: {done}')
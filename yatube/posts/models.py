@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 
 from django.contrib.auth import get_user_model
 
+from core.querycache import CachingManager
+
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -9,6 +13,10 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.IntegerField(default=0, editable=False)
+
+    # Группы меняются редко, а читаются почти на каждой странице
+    objects = CachingManager()
 
     def __str__(self):
         return self.title
@@ -16,7 +24,7 @@ class Group(models.Model):
 
 class Post(models.Model):
     text = models.TextField()
-    pub_date = models.DateTimeField(auto_now_add=True)
+    pub_date = models.DateTimeField(auto_now_add=True, db_index=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -32,15 +40,48 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comments_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Группа на момент загрузки: при переносе поста сбрасываются
+        # страницы и старой, и новой группы
+        loaded = dict(zip(field_names, values))
+        instance._loaded_group_id = loaded.get('group_id')
+        # Картинка на момент загрузки: её ссылку нужно снять при замене
+        if 'image' in loaded:
+            instance._loaded_image = loaded['image']
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Запись файла картинки держит блокировку его ImageBlob до
+        # фиксации, а ссылку на файл добавляет сигнал post_save - обе
+        # должны быть в одной транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_group_id = self.group_id
+        self._loaded_image = self.image.name
+
 
 class Comment(models.Model):
     text = models.TextField()
@@ -56,6 +97,33 @@ class Comment(models.Model):
         related_name='comments'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.IntegerField(default=0)
+    followers_count = models.IntegerField(default=0, db_index=True)
+    following_count = models.IntegerField(default=0)
+
+
+class ImageBlob(models.Model):
+    """Число постов, ссылающихся на файл картинки в хранилище."""
+    name = models.CharField(max_length=100, primary_key=True)
+    refs = models.IntegerField(default=0)
+
 
 class Follow(models.Model):
     author = models.ForeignKey(
@@ -68,3 +136,59 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='follower'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    # Копия Post.pub_date: лента читается по индексу без join
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post_id']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry',
+            ),
+        ]
+
+
+class ThumbnailJob(models.Model):
+    """Миниатюра в очереди воркера thumbnail_worker."""
+    source = models.CharField(max_length=255)
+    geometry = models.CharField(max_length=50)
+    options = models.CharField(max_length=255)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'geometry', 'options'],
+                name='unique_thumbnail_job'
+            ),
+        ]
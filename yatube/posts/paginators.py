@@ -0,0 +1,254 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+def encode_cursor(pub_date, pk):
+    """Упаковывает позицию (pub_date, id) в непрозрачный токен."""
+    raw = f'{pub_date.isoformat()}|{pk}'.encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для испорченного токена возвращает None."""
+    try:
+        raw = urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации, совместимая с шаблонами Page."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class UnavailablePage(Sequence):
+    """Страница, которую не удалось прочитать из БД.
+
+    Несёт только номер или курсорный режим запроса - этого хватает для
+    ключа фрагмента ленты, чтобы шаблон отдал его устаревшую копию.
+    Обращение к постам повторяет исходную ошибку.
+    """
+
+    def __init__(self, request, error):
+        self.error = error
+        self.is_cursor = bool(
+            settings.CURSOR_PAGINATION
+            or request.GET.get('after') or request.GET.get('before')
+        )
+        try:
+            self.number = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            self.number = 1
+
+    def __len__(self):
+        raise self.error
+
+    def __getitem__(self, index):
+        raise self.error
+
+
+class CursorPaginator:
+    """Keyset-пагинация по паре (pub_date, id) от новых записей к старым.
+
+    Каждая страница - один запрос с WHERE по ключу и LIMIT per_page + 1,
+    без OFFSET и без COUNT(*), поэтому глубокие страницы стоят столько же,
+    сколько первая.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.keys = keys
+
+    @cached_property
+    def count(self):
+        """Общее число объектов; считается только по явному запросу."""
+        return self.object_list.count()
+
+    def _seek(self, position, older):
+        date_key, id_key = self.keys
+        lookup = 'lt' if older else 'gt'
+        pub_date, pk = position
+        return (
+            Q(**{f'{date_key}__{lookup}': pub_date})
+            | Q(**{date_key: pub_date, f'{id_key}__{lookup}': pk})
+        )
+
+    def _cursor(self, obj):
+        date_key, id_key = self.keys
+        return encode_cursor(getattr(obj, date_key), getattr(obj, id_key))
+
+    def page(self, after=None, before=None):
+        date_key, id_key = self.keys
+        if before is not None:
+            rows = list(
+                self.object_list
+                .filter(self._seek(before, older=False))
+                .order_by(date_key, id_key)[:self.per_page + 1]
+            )
+            has_newer = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_older = True
+        else:
+            queryset = self.object_list
+            if after is not None:
+                queryset = queryset.filter(self._seek(after, older=True))
+            rows = list(
+                queryset.order_by(
+                    f'-{date_key}', f'-{id_key}'
+                )[:self.per_page + 1]
+            )
+            has_older = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_newer = after is not None
+        next_cursor = previous_cursor = None
+        if rows and has_older:
+            next_cursor = self._cursor(rows[-1])
+        if rows and has_newer:
+            previous_cursor = self._cursor(rows[0])
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def get_page(self, after=None, before=None):
+        """Испорченный токен ведёт на первую страницу, как в get_page."""
+        if before:
+            position = decode_cursor(before)
+            if position is not None:
+                return self.page(before=position)
+        if after:
+            position = decode_cursor(after)
+            if position is not None:
+                return self.page(after=position)
+        return self.page()
+
+
+ELLIPSIS = '…'
+
+
+def elided_page_range(page_obj, on_each_side=2, on_ends=1):
+    """Номера страниц для навигации: края и окно вокруг текущей.
+
+    Пропуски обозначаются ELLIPSIS, поэтому элементов не больше
+    2 * (on_each_side + on_ends) + 3 при любом числе страниц.
+    """
+    number = page_obj.number
+    num_pages = page_obj.paginator.num_pages
+    if num_pages <= 2 * (on_each_side + on_ends) + 1:
+        yield from range(1, num_pages + 1)
+        return
+    if number > on_each_side + on_ends + 1:
+        yield from range(1, on_ends + 1)
+        yield ELLIPSIS
+        yield from range(number - on_each_side, number + 1)
+    else:
+        yield from range(1, number + 1)
+    if number < num_pages - on_each_side - on_ends:
+        yield from range(number + 1, number + on_each_side + 1)
+        yield ELLIPSIS
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(number + 1, num_pages + 1)
+
+
+def estimated_rows(model, using='default'):
+    """Число строк таблицы по статистике планировщика или None.
+
+    Статистика обновляется ANALYZE (в PostgreSQL - и autovacuum),
+    поэтому значение приблизительное, зато не требует обхода таблицы.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples FROM pg_class WHERE relname = %s'
+    elif connection.vendor == 'sqlite':
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # sqlite_stat1 появляется только после первого ANALYZE
+        return None
+    if row is None:
+        return None
+    # В sqlite_stat1 первое число stat - количество строк
+    rows = int(float(str(row[0]).split()[0]))
+    return rows if rows >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для списков админки на больших таблицах.
+
+    Точный COUNT(*) выполняется не дальше ADMIN_EXACT_COUNT_LIMIT строк.
+    Больший список без фильтров получает оценку из статистики СУБД,
+    отфильтрованный - сам предел, то есть страниц становится не больше
+    ADMIN_EXACT_COUNT_LIMIT / per_page.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        counted = queryset.values('pk')[:limit + 1].count()
+        if counted <= limit:
+            return counted
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return limit
+
+
+def paginate(request, object_list, per_page, keys=('pub_date', 'id')):
+    """Возвращает страницу списка с учётом режима пагинации.
+
+    По умолчанию используется обычный Paginator с ?page=N. Курсорный режим
+    включается настройкой CURSOR_PAGINATION или токенами ?after= / ?before=.
+    """
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if settings.CURSOR_PAGINATION or after or before:
+        paginator = CursorPaginator(object_list, per_page, keys)
+        return paginator.get_page(after=after, before=before)
+    paginator = Paginator(object_list, per_page)
+    return paginator.get_page(request.GET.get('page'))
@@ -0,0 +1,89 @@
+"""Строки лент для отрисовки карточек без моделей.
+
+Карточка поста показывает имя и логин автора, дату, группу, текст и
+картинку. Лента с FEED_READ_MODEL выбирает только эти колонки через
+values_list() и отдаёт их кортежами PostRow: без экземпляров Post, User и
+Group с их __dict__ и _state на каждую строку. Атрибуты строки
+повторяют то, что шаблоны берут у поста: post.author.get_full_name,
+post.group.slug, post.image и т. д.
+"""
+from collections import namedtuple
+from operator import itemgetter
+
+from django.db.models.query import BaseIterable
+
+from .models import Post
+
+# Колонки в порядке полей PostRow
+COLUMNS = (
+    'id', 'text', 'pub_date', 'image',
+    'author_id', 'author__username', 'author__first_name',
+    'author__last_name',
+    'group_id', 'group__title', 'group__slug',
+)
+IMAGE_FIELD = Post._meta.get_field('image')
+
+
+class AuthorRow(namedtuple('AuthorRow', 'pk username first_name last_name')):
+    __slots__ = ()
+
+    def get_full_name(self):
+        return f'{self.first_name} {self.last_name}'.strip()
+
+    def __str__(self):
+        return self.username
+
+
+class GroupRow(namedtuple('GroupRow', 'pk title slug')):
+    __slots__ = ()
+
+    def __str__(self):
+        return self.title
+
+
+class PostRow(namedtuple('PostRow', (
+    'id text pub_date image_name author_id author_username '
+    'author_first_name author_last_name group_id group_title group_slug'
+))):
+    __slots__ = ()
+
+    pk = property(itemgetter(0))
+
+    @property
+    def author(self):
+        return AuthorRow(
+            self.author_id, self.author_username,
+            self.author_first_name, self.author_last_name
+        )
+
+    @property
+    def group(self):
+        if self.group_id is None:
+            return None
+        return GroupRow(self.group_id, self.group_title, self.group_slug)
+
+    @property
+    def image(self):
+        # Файл из хранилища поля, как у Post.image: миниатюры и url
+        # строятся так же
+        return IMAGE_FIELD.attr_class(None, IMAGE_FIELD, self.image_name)
+
+
+class PostRowIterable(BaseIterable):
+    """Строки выборки сразу кортежами PostRow, без промежуточных."""
+
+    def __iter__(self):
+        queryset = self.queryset
+        compiler = queryset.query.get_compiler(queryset.db)
+        new = tuple.__new__
+        for row in compiler.results_iter(
+            chunked_fetch=self.chunked_fetch, chunk_size=self.chunk_size
+        ):
+            yield new(PostRow, row)
+
+
+def post_rows(queryset):
+    """Выборка постов строками PostRow в порядке queryset."""
+    queryset = queryset.values_list(*COLUMNS)
+    queryset._iterable_class = PostRowIterable
+    return queryset
@@ -0,0 +1,117 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+posts_post_fts - внешний FTS5-индекс над posts_post.text (content=),
+его синхронизируют триггеры на вставку, удаление и правку текста, так что
+bulk_create и QuerySet.update тоже попадают в индекс. SQLite пересоздаёт
+таблицу при изменении её полей в миграциях и теряет триггеры, поэтому
+install() восстанавливает их после каждого migrate. Русской морфологии в
+FTS5 нет: слова запроса ищутся как префиксы.
+"""
+import re
+
+from django.db import connection
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert "
+    "AFTER INSERT ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete "
+    "AFTER DELETE ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update "
+    "AFTER UPDATE OF text ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    "END",
+)
+TERM = re.compile(r'\w+')
+
+
+def enabled(using=None):
+    return (using or connection).vendor == 'sqlite'
+
+
+def install(using=None):
+    """Создаёт недостающие индекс и триггеры."""
+    using = using or connection
+    with using.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+
+def rebuild(using=None):
+    """Заново строит индекс по posts_post и уплотняет его."""
+    using = using or connection
+    install(using)
+    with using.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"
+        )
+
+
+def terms(query):
+    return TERM.findall(query.lower())
+
+
+def match_expression(query):
+    """Запрос FTS5: все слова обязательны, каждое - как префикс.
+
+    Слова состоят только из букв и цифр и берутся в кавычки, поэтому
+    синтаксис FTS5 (OR, NEAR, столбцы) из пользовательского ввода
+    не выполняется.
+    """
+    return ' '.join(f'"{term}"*' for term in terms(query))
+
+
+def matching(queryset, query):
+    """Фильтр queryset по индексу без ранжирования (для админки)."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not enabled():
+        for term in terms(query):
+            queryset = queryset.filter(text__icontains=term)
+        return queryset
+    # Не RawSQL в pk__in: Django берёт его в скобки, и SQLite читает
+    # IN ((SELECT ...)) как скалярный подзапрос с одной строкой
+    return queryset.extra(
+        where=[
+            f'posts_post.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)'
+        ],
+        params=[expression],
+    )
+
+
+def search(query, queryset=None):
+    """Посты по запросу, самые релевантные (bm25) первыми."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not enabled():
+        return matching(queryset, query)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[
+            f'{FTS_TABLE}.rowid = posts_post.id',
+            f'{FTS_TABLE} MATCH %s',
+        ],
+        params=[expression],
+        select={'rank': f'bm25({FTS_TABLE})'},
+        order_by=['rank', '-pub_date'],
+    )
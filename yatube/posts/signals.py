@@ -0,0 +1,182 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from core.cache import bump_on_commit
+
+from . import authors, counters, feed, groups, search, thumbnails
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, created, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    # Правка без замены картинки миниатюры не ставит: они уже есть или
+    # в очереди, а каждая выполненная задача сбрасывает страницы ленты
+    previous = '' if created else getattr(instance, '_loaded_image', None)
+    if previous != instance.image.name:
+        thumbnails.pregenerate(instance.image)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_feed(sender, instance, **kwargs):
+    feed.remove(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    scopes = {
+        'index', f'post:{instance.pk}', f'profile:{instance.author_id}'
+    }
+    group_ids = {
+        instance.group_id, getattr(instance, '_loaded_group_id', None)
+    }
+    scopes.update(
+        f'group:{group_id}' for group_id in group_ids if group_id
+    )
+    bump_on_commit(*scopes)
+
+
+@receiver(post_save, sender=Post)
+def remember_post_author(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        authors.remember(instance)
+
+
+@receiver(post_delete, sender=Post)
+def forget_post_author(sender, instance, **kwargs):
+    authors.forget(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    # Название группы есть в карточках всех лент
+    bump_on_commit('groups')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def refresh_group_snapshot(sender, instance, **kwargs):
+    groups.invalidate()
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    # Счётчики подписок показываются в профилях обоих пользователей
+    bump_on_commit(
+        f'profile:{instance.author_id}', f'profile:{instance.user_id}'
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_cards(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login - его в карточках нет
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_on_commit(f'user:{instance.pk}', 'users')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post_detail(sender, instance, **kwargs):
+    bump_on_commit(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.shift_user(instance.author_id, posts_count=1)
+        counters.shift_group(instance.group_id, 1)
+        return
+    if not hasattr(instance, '_loaded_group_id'):
+        return
+    if instance._loaded_group_id != instance.group_id:
+        counters.shift_group(instance._loaded_group_id, -1)
+        counters.shift_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.shift_user(instance.author_id, posts_count=-1)
+    counters.shift_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift(
+            Post.objects.filter(pk=instance.post_id), comments_count=1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.shift(
+        Post.objects.filter(pk=instance.post_id), comments_count=-1
+    )
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift_user(instance.user_id, following_count=1)
+        counters.shift_user(instance.author_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.shift_user(instance.user_id, following_count=-1)
+    counters.shift_user(instance.author_id, followers_count=-1)
+
+
+@receiver(post_delete, sender=Follow)
+def demote_author(sender, instance, **kwargs):
+    # После uncount_follow: решает по уже уменьшенному счётчику
+    feed.demote(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = '' if created else getattr(instance, '_loaded_image', None)
+    if previous is None or previous == instance.image.name:
+        return
+    if instance.image:
+        counters.retain_image(instance.image.name)
+    if previous:
+        counters.release_image(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_image_ref(sender, instance, **kwargs):
+    if instance.image:
+        counters.release_image(instance.image.name)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    # Пересоздание posts_post в миграциях SQLite удаляет триггеры индекса
+    connection = connections[using]
+    if sender.name != 'posts' or not search.enabled(connection):
+        return
+    if search.FTS_TABLE in connection.introspection.table_names():
+        search.install(connection)
@@ -0,0 +1,71 @@
+"""Адресуемое по содержимому хранилище картинок постов.
+
+Файл сохраняется под SHA-256 своих байтов: posts/ab/abcd...ef.jpg.
+Хэш считается при потоковой записи во временный файл рядом с целевым,
+поэтому одинаковые картинки хранятся один раз, а их миниатюры sorl,
+зависящие только от имени исходника, тоже общие. Ссылки постов на файл
+считает ImageBlob: файл удаляется, только когда на него не ссылается
+ни один пост (см. counters.release_image). Проверка существующего файла
+и его удаление идут под одной блокировкой (counters.lock_image).
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+def digest_name(directory, digest, extension):
+    return '/'.join(
+        part for part in (directory, digest[:2], digest + extension) if part
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяет содержимое файла, а не имя загрузки
+        return name
+
+    def _save(self, name, content):
+        # counters импортирует модели, а модели - это хранилище
+        from .counters import lock_image
+
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(
+            dir=self.path(directory), suffix='.upload', delete=False
+        ) as temporary:
+            try:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                os.unlink(temporary.name)
+                raise
+        name = digest_name(directory, digest.hexdigest(), extension)
+        path = self.path(name)
+        with transaction.atomic():
+            # Файл без ссылок не удалится, пока транзакция, в которой
+            # сохраняется пост (Post.save), не добавит ему ссылку
+            lock_image(name)
+            if os.path.exists(path):
+                os.unlink(temporary.name)
+                return name
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temporary.name, path)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        else:
+            # mkstemp создаёт файл 0600, приводим к правам обычной записи
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(path, 0o666 & ~umask)
+        return name
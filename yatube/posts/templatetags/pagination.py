@@ -0,0 +1,16 @@
+from django import template
+
+from posts.paginators import ELLIPSIS, elided_page_range
+
+register = template.Library()
+
+
+@register.filter
+def elided_range(page_obj, on_each_side=2):
+    """Номера страниц вокруг текущей с пропусками вместо остальных."""
+    return elided_page_range(page_obj, on_each_side=int(on_each_side))
+
+
+@register.filter
+def is_ellipsis(item):
+    return item == ELLIPSIS
@@ -0,0 +1,55 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.cache import get_generations
+from posts.thumbnails import prefetch
+
+register = template.Library()
+
+CARD_KEY = 'post_card:{}:{}:{}:{}'
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Возвращает пары (пост, html карточки) для страницы ленты.
+
+    Карточки берутся из кэша одним get_many; ключ включает поколения поста,
+    автора и групп, поэтому правка любого из них даёт новую карточку.
+    Отрисовываются только промахи, метаданные их миниатюр загружаются
+    заранее одним пакетом.
+    """
+    posts = list(posts)
+    scopes = {'groups'}
+    for post in posts:
+        scopes.update((f'post:{post.pk}', f'user:{post.author_id}'))
+    scopes = list(scopes)
+    generations = dict(zip(scopes, get_generations(scopes)))
+    keys = [
+        CARD_KEY.format(
+            post.pk,
+            generations[f'post:{post.pk}'],
+            generations[f'user:{post.author_id}'],
+            generations['groups'],
+        )
+        for post in posts
+    ]
+    cached = cache.get_many(keys)
+    # Метаданные миниатюр всех промахов читаются одним пакетом
+    prefetch(
+        post.image for post, key in zip(posts, keys) if key not in cached
+    )
+    rendered = {}
+    cards = []
+    for post, key in zip(posts, keys):
+        card = cached.get(key)
+        if card is None:
+            card = rendered[key] = render_to_string(
+                'posts/includes/post_list.html', {'post': post}
+            )
+        cards.append((post, mark_safe(card)))
+    if rendered:
+        cache.set_many(rendered, CARD_TIMEOUT)
+    return cards
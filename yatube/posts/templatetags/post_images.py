@@ -0,0 +1,14 @@
+from django import template
+
+from posts.thumbnails import derivatives
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(image):
+    """Картинка поста в нескольких ширинах и форматах: <picture> со
+    srcset, из которого браузер берёт наименьший подходящий файл."""
+    if not image:
+        return {}
+    return derivatives(image)
@@ -0,0 +1,186 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import cache as shared
+from posts import bulk, search
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.user = User.objects.create_user(username='auth')
+        cls.groups = Group.objects.bulk_create([
+            Group(title=f'Группа {i}', slug=f'group-{i}', description='-')
+            for i in range(5)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def add_posts(self, count):
+        groups = list(Group.objects.all())
+        posts = Post.objects.bulk_create([
+            Post(author=self.user, text=f'Пост {i}',
+                 group=groups[i % len(groups)])
+            for i in range(count)
+        ])
+        Comment.objects.bulk_create([
+            Comment(author=self.user, post=post, text='Комментарий')
+            for post in Post.objects.all()
+        ])
+        return posts
+
+    def changelist_queries(self, model):
+        url = reverse(f'admin:posts_{model}_changelist')
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.add_posts(2)
+        Follow.objects.create(user=self.user, author=self.admin)
+        few = {
+            model: self.changelist_queries(model)
+            for model in ('post', 'comment', 'follow')
+        }
+        self.add_posts(20)
+        Follow.objects.create(user=self.admin, author=self.user)
+        for model, count in few.items():
+            with self.subTest(model=model):
+                self.assertEqual(self.changelist_queries(model), count)
+
+    def test_group_select_renders_only_selected_option(self):
+        self.add_posts(3)
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        content = response.content.decode()
+        # Все группы перечисляет только форма действий над списком
+        self.assertEqual(content.count('Группа 4'), 1)
+        self.assertEqual(content.count('selected>Группа 0'), 1)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_count_is_capped_or_estimated(self):
+        self.add_posts(8)
+        queryset = Post.objects.all()
+        self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 5)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 8)
+        filtered = queryset.filter(text__startswith='Пост')
+        self.assertEqual(EstimatedCountPaginator(filtered, 2).count, 5)
+        small = queryset.filter(group__slug='group-0')
+        self.assertEqual(EstimatedCountPaginator(small, 2).count, 2)
+
+
+@override_settings(ADMIN_BATCH_SIZE=2)
+class BulkActionsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.user = User.objects.create_user(username='auth')
+        cls.old = Group.objects.create(
+            title='Старая', slug='old', description='-'
+        )
+        cls.new = Group.objects.create(
+            title='Новая', slug='new', description='-'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.posts = [
+            Post.objects.create(
+                author=self.user, text=f'Пост {i}', group=self.old
+            )
+            for i in range(5)
+        ]
+        for post in self.posts:
+            Comment.objects.create(
+                author=self.admin, post=post, text='Комментарий'
+            )
+
+    def act(self, action, posts, **data):
+        return self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': action,
+                '_selected_action': [post.pk for post in posts],
+                **data,
+            }
+        )
+
+    def group_counts(self):
+        return dict(Group.objects.values_list('slug', 'posts_count'))
+
+    def test_move_to_group(self):
+        self.act('move_to_group', self.posts[:3], group=self.new.pk)
+        self.assertEqual(
+            Post.objects.filter(group=self.new).count(), 3
+        )
+        self.assertEqual(self.group_counts(), {'old': 2, 'new': 3})
+        self.act('move_to_group', self.posts[:1], group='')
+        self.assertEqual(self.group_counts(), {'old': 2, 'new': 2})
+        self.assertIsNone(Post.objects.get(pk=self.posts[0].pk).group)
+
+    def test_delete_asks_for_confirmation(self):
+        response = self.act('delete_in_batches', self.posts)
+        self.assertContains(response, 'Будут удалены постов: 5')
+        self.assertEqual(Post.objects.count(), 5)
+
+    def test_delete_in_batches(self):
+        self.act('delete_in_batches', self.posts[:4], post='yes')
+        self.assertEqual(list(Post.objects.all()), [self.posts[4]])
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(self.group_counts(), {'old': 1, 'new': 0})
+        self.assertEqual(self.user.stats.posts_count, 1)
+        self.assertFalse(search.search('пост').exclude(pk=self.posts[4].pk))
+
+    def test_progress_is_reported_per_batch(self):
+        progress = []
+        bulk.delete_posts(Post.objects.all(), progress=progress.append)
+        self.assertEqual(progress, [2, 4, 5])
+
+
+@override_settings(ADMIN_BATCH_SIZE=2)
+class BulkCommitTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        for i in range(3):
+            Post.objects.create(author=self.user, text=f'Пост {i}')
+
+    def test_batches_bump_scopes_again_after_commit(self):
+        bumps = []
+
+        def bump(*scopes):
+            if 'index' in scopes:
+                bumps.append(connection.in_atomic_block)
+            return shared.time.time()
+
+        with mock.patch.object(shared, 'bump', side_effect=bump):
+            bulk.delete_posts(Post.objects.all())
+        # На каждый из двух пакетов: сдвиг в транзакции и после COMMIT
+        self.assertEqual(bumps, [True, False, True, False])
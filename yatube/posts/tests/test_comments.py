@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.views import COMMENTS_COUNT
+
+User = get_user_model()
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        users = [
+            User.objects.create_user(username=f'reader{i}') for i in range(5)
+        ]
+        Comment.objects.bulk_create([
+            Comment(
+                post=cls.post, author=users[i % len(users)],
+                text=f'Комментарий {i}'
+            )
+            for i in range(COMMENTS_COUNT * 2 + 5)
+        ])
+        cls.comments = list(
+            Comment.objects.filter(post=cls.post).order_by('-created', '-id')
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_first_render_is_bounded(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.comments[:COMMENTS_COUNT])
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, 'data-more-comments')
+        # Авторы комментариев приходят в том же запросе, что и комментарии
+        self.assertFalse(any(
+            'FROM "auth_user" WHERE "auth_user"."id" =' in query['sql']
+            for query in queries
+        ))
+
+    def test_fragments_walk_all_comments(self):
+        url = reverse('posts:comment_list', kwargs={'post_id': self.post.pk})
+        response = self.guest_client.get(url)
+        seen = list(response.context['comments'])
+        while response.context['comments'].has_next():
+            response = self.guest_client.get(
+                url, {'after': response.context['comments'].next_cursor}
+            )
+            self.assertNotContains(response, '<html')
+            seen.extend(response.context['comments'])
+        self.assertEqual(seen, self.comments)
+
+    def test_fragment_of_missing_post(self):
+        response = self.guest_client.get(
+            reverse('posts:comment_list', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
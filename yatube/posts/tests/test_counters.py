@@ -0,0 +1,114 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа', slug='other', description='Описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(CountersTest.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(CountersTest.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'group': self.group.pk}
+        )
+        post = Post.objects.get(text='Пост')
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'}
+        )
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_group_move(self):
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Пост', 'group': self.other_group.pk}
+        )
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+    def test_follow_counters(self):
+        kwargs = {'username': self.author.username}
+        self.reader_client.get(reverse('posts:profile_follow', kwargs=kwargs))
+        self.reader_client.get(reverse('posts:profile_follow', kwargs=kwargs))
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', kwargs=kwargs)
+        )
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_pages_read_counters(self):
+        """Страницы берут счётчики из UserStats, а не из COUNT(*)."""
+        Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        response = self.reader_client.get(
+            reverse('posts:profile', kwargs={'username': self.author})
+        )
+        self.assertEqual(response.context['h3'], 42)
+        post = Post.objects.get()
+        response = self.reader_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertEqual(response.context['author_stats'].posts_count, 42)
+
+    def test_reconcile_repairs_drift(self):
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+        Post.objects.bulk_create(
+            [Post(author=self.author, text=f'Пост {i}') for i in range(3)]
+        )
+        Comment.objects.bulk_create(
+            [Comment(author=self.reader, post=post, text='Комментарий')]
+        )
+        Group.objects.update(posts_count=7)
+        UserStats.objects.filter(user=self.reader).delete()
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 4)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
@@ -0,0 +1,193 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import feed
+from posts.models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+class FeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.follower = User.objects.create_user(username='Follower')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(FeedTest.follower)
+        self.author_client = Client()
+        self.author_client.force_login(FeedTest.author)
+
+    def feed_posts(self):
+        return list(
+            Post.objects.filter(feed_entries__user=self.follower)
+        )
+
+    def follow(self):
+        self.follower_client.get(
+            reverse('posts:profile_follow', kwargs={'username': self.author})
+        )
+
+    def test_follow_backfills_feed(self):
+        self.follow()
+        self.assertEqual(self.feed_posts(), [self.old_post])
+
+    def test_post_create_fans_out(self):
+        self.follow()
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'}
+        )
+        new_post = Post.objects.get(text='Новый пост')
+        self.assertEqual(self.feed_posts(), [new_post, self.old_post])
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.old_post]
+        )
+
+    def test_unfollow_removes_entries(self):
+        self.follow()
+        self.follower_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': self.author})
+        )
+        self.assertEqual(self.feed_posts(), [])
+
+    @override_settings(FEED_DEPTH=2)
+    def test_feed_is_trimmed(self):
+        self.follow()
+        for i in range(3):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        self.assertEqual(
+            self.feed_posts(),
+            list(Post.objects.filter(author=self.author)[:2])
+        )
+
+    def test_fan_out_queries_do_not_grow_with_followers(self):
+        def fan_out_queries(followers):
+            Follow.objects.bulk_create([
+                Follow(user=User.objects.create_user(username=name),
+                       author=self.author)
+                for name in followers
+            ])
+            post = Post.objects.create(author=self.author, text='Пост')
+            with CaptureQueriesContext(connection) as queries:
+                feed.fan_out(post)
+            return len(queries)
+
+        few = fan_out_queries(['reader0', 'reader1'])
+        self.assertEqual(
+            fan_out_queries([f'reader{i}' for i in range(2, 30)]), few
+        )
+
+    def test_rebuild_feed_command(self):
+        Follow.objects.bulk_create(
+            [Follow(user=self.follower, author=self.author)]
+        )
+        self.assertEqual(self.feed_posts(), [])
+        call_command('rebuild_feed', stdout=StringIO())
+        self.assertEqual(self.feed_posts(), [self.old_post])
+        self.assertEqual(FeedEntry.objects.count(), 1)
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=1)
+class HybridFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='Star')
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.fan = User.objects.create_user(username='Fan')
+        Follow.objects.create(user=cls.fan, author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(HybridFeedTest.reader)
+
+    def test_popular_author_is_pulled(self):
+        """Посты автора выше порога не раскладываются, а сливаются
+        с лентой при чтении в порядке pub_date."""
+        posts = [
+            Post.objects.create(author=author, text=f'Пост {i}')
+            for i, author in enumerate(
+                [self.star, self.author, self.star, self.author]
+            )
+        ]
+        self.assertFalse(
+            FeedEntry.objects.filter(post__author=self.star).exists()
+        )
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), posts[::-1])
+        self.assertEqual(response['X-Feed-Path'], 'hybrid')
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_pages_over_merged_feed(self):
+        for i in range(12):
+            Post.objects.create(
+                author=self.star if i % 3 else self.author,
+                text=f'Пост {i}'
+            )
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        url = reverse('posts:follow_index')
+        first = self.reader_client.get(url).context['page_obj']
+        second = self.reader_client.get(
+            f'{url}?after={first.next_cursor}'
+        ).context['page_obj']
+        self.assertEqual(list(first) + list(second), expected)
+        self.assertFalse(second.has_next())
+
+    def test_push_path_without_popular_authors(self):
+        Follow.objects.filter(author=self.star).delete()
+        Post.objects.create(author=self.author, text='Обычный пост')
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response['X-Feed-Path'], 'push')
+
+    def test_demoted_author_posts_stay_in_feed(self):
+        post = Post.objects.create(author=self.star, text='Пост звезды')
+        Follow.objects.filter(user=self.fan, author=self.star).delete()
+        cache.clear()
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+        self.assertEqual(response['X-Feed-Path'], 'push')
+
+    @override_settings(FEED_DEPTH=2)
+    def test_pull_is_limited_to_feed_depth(self):
+        posts = [
+            Post.objects.create(author=self.star, text=f'Пост {i}')
+            for i in range(4)
+        ]
+        source = feed.feed_for(self.reader)
+        self.assertEqual(source.count(), 2)
+        self.assertEqual(
+            [entry.post for entry in source[0:4]], posts[:1:-1]
+        )
+
+    def test_paths_are_counted_across_requests(self):
+        feed.reset_path_counts()
+        for author in (self.star, self.author):
+            Post.objects.create(author=author, text='Пост')
+        self.reader_client.get(reverse('posts:follow_index'))
+        Follow.objects.filter(author=self.star).delete()
+        self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            feed.path_counts(), {'push': 1, 'pull': 0, 'hybrid': 1}
+        )
+        out = StringIO()
+        call_command('feed_stats', '--reset', stdout=out)
+        self.assertIn('hybrid', out.getvalue())
+        self.assertEqual(sum(feed.path_counts().values()), 0)
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from core.cache import bump
+from posts import groups
+from posts.admin import PostActionForm
+from posts.forms import PostForm
+from posts.models import Group
+
+
+# Общий снимок запоминается только вне транзакций с записью в группы
+class GroupSnapshotTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        groups.invalidate()
+        self.cats = Group.objects.create(
+            title='Коты', slug='cats', description='-'
+        )
+        self.cars = Group.objects.create(
+            title='Автомобили', slug='cars', description='-'
+        )
+
+    def test_lookups_do_not_query(self):
+        groups.snapshot()
+        with self.assertNumQueries(0):
+            self.assertEqual(groups.get_by_slug('cats'), self.cats)
+            self.assertEqual(groups.get_by_id(self.cars.pk), self.cars)
+            self.assertIsNone(groups.get_by_slug('missing'))
+            self.assertEqual(groups.ordered(), (self.cars, self.cats))
+
+    def test_snapshot_follows_changes(self):
+        groups.snapshot()
+        birds = Group.objects.create(title='Птицы', slug='birds')
+        self.assertEqual(groups.get_by_slug('birds'), birds)
+        Group.objects.filter(pk=self.cats.pk).update(title='Кошки')
+        bump('groups')
+        self.assertEqual(groups.get_by_slug('cats').title, 'Кошки')
+        birds.delete()
+        self.assertIsNone(groups.get_by_slug('birds'))
+
+    def test_post_counters_keep_snapshot(self):
+        current = groups.snapshot()
+        Group.objects.filter(pk=self.cats.pk).update(posts_count=5)
+        self.assertIs(groups.snapshot(), current)
+
+    def test_rolled_back_groups_stay_out_of_snapshot(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Group.objects.create(title='Черновик', slug='draft')
+                self.assertIsNotNone(groups.get_by_slug('draft'))
+                raise RuntimeError
+        self.assertIsNone(groups.get_by_slug('draft'))
+
+    def test_forms_render_choices_from_snapshot(self):
+        groups.snapshot()
+        for form in (PostForm(), PostActionForm()):
+            with self.subTest(form=type(form).__name__):
+                with self.assertNumQueries(0):
+                    html = str(form['group'])
+                self.assertIn('Автомобили', html)
+                self.assertIn('Коты', html)
+        choices = list(PostForm().fields['group'].choices)
+        self.assertEqual(
+            [label for _, label in choices],
+            ['---------', 'Автомобили', 'Коты']
+        )
@@ -0,0 +1,113 @@
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts.forms import PostForm
+
+EXIF_ORIENTATION = 0x0112
+EXIF_MODEL = 0x0110
+
+
+def upload(name, image, fmt, **options):
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ImageIngestTest(TestCase):
+    def clean(self, file):
+        form = PostForm(data={'text': 'Пост'}, files={'image': file})
+        return form, form.is_valid()
+
+    def open(self, form):
+        image = form.cleaned_data['image']
+        image.seek(0)
+        return Image.open(image)
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_photo_is_rotated_resized_and_stripped(self):
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = 6
+        form, valid = self.clean(upload(
+            'photo.jpeg', Image.new('RGB', (300, 150)), 'JPEG',
+            exif=exif.tobytes()
+        ))
+        self.assertTrue(valid, form.errors)
+        self.assertEqual(form.cleaned_data['image'].name, 'photo.jpg')
+        image = self.open(form)
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (50, 100))
+        self.assertNotIn('exif', image.info)
+
+    def test_transparent_image_stays_png(self):
+        form, valid = self.clean(upload(
+            'logo.png', Image.new('RGBA', (20, 20), (0, 0, 0, 0)), 'PNG'
+        ))
+        self.assertTrue(valid, form.errors)
+        image = self.open(form)
+        self.assertEqual((image.format, image.mode), ('PNG', 'RGBA'))
+
+    def test_png_metadata_is_stripped(self):
+        exif = Image.Exif()
+        exif[EXIF_MODEL] = 'SecretCamera'
+        form, valid = self.clean(upload(
+            'logo.png', Image.new('RGBA', (20, 20)), 'PNG',
+            exif=exif.tobytes()
+        ))
+        self.assertTrue(valid, form.errors)
+        image = self.open(form)
+        self.assertNotIn('exif', image.info)
+        form.cleaned_data['image'].seek(0)
+        self.assertNotIn(b'SecretCamera', form.cleaned_data['image'].read())
+
+    def test_gif_comment_is_stripped(self):
+        frames = [Image.new('P', (10, 10), color) for color in (1, 2)]
+        buffer = BytesIO()
+        frames[0].save(
+            buffer, 'GIF', save_all=True, append_images=frames[1:],
+            comment=b'SecretComment'
+        )
+        form, valid = self.clean(
+            SimpleUploadedFile('anim.gif', buffer.getvalue())
+        )
+        self.assertTrue(valid, form.errors)
+        self.assertNotIn('comment', self.open(form).info)
+        form.cleaned_data['image'].seek(0)
+        self.assertNotIn(
+            b'SecretComment', form.cleaned_data['image'].read()
+        )
+
+    def test_animated_gif_keeps_frames(self):
+        frames = [Image.new('P', (10, 10), color) for color in (1, 2, 3)]
+        buffer = BytesIO()
+        frames[0].save(
+            buffer, 'GIF', save_all=True, append_images=frames[1:],
+            duration=100, loop=0
+        )
+        form, valid = self.clean(
+            SimpleUploadedFile('anim.gif', buffer.getvalue())
+        )
+        self.assertTrue(valid, form.errors)
+        self.assertEqual(self.open(form).n_frames, 3)
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_byte_limit(self):
+        form, valid = self.clean(upload(
+            'big.png', Image.effect_noise((100, 100), 50), 'PNG'
+        ))
+        self.assertFalse(valid)
+        self.assertEqual(
+            form.errors.as_data()['image'][0].code, 'file_too_large'
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_pixel_limit(self):
+        form, valid = self.clean(
+            upload('wide.png', Image.new('RGB', (20, 20)), 'PNG')
+        )
+        self.assertFalse(valid)
+        self.assertEqual(
+            form.errors.as_data()['image'][0].code, 'too_many_pixels'
+        )
@@ -0,0 +1,213 @@
+import hashlib
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache import bump, get_generations
+from core.decorators import PAGE_KEY
+from core.middleware import FAILED_WARNING, STALE_WARNING
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(AnonymousPageCacheTest.user)
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+
+    def test_not_modified_for_matching_etag(self):
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        response = self.guest_client.get(
+            reverse('posts:index'), HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_cached_body_served_without_render(self):
+        first = self.guest_client.get(self.detail_url)
+        second = self.guest_client.get(self.detail_url)
+        self.assertIsNone(second.context)
+        self.assertEqual(first.content, second.content)
+
+    def test_comment_changes_etag(self):
+        etag = self.guest_client.get(self.detail_url)['ETag']
+        Comment.objects.create(
+            author=self.user, post=self.post, text='Новый комментарий'
+        )
+        response = self.guest_client.get(
+            self.detail_url, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_author_floor_does_not_raise_shared_generations(self):
+        self.authorized_client.get(reverse('posts:index'))
+        shared = get_generations(('groups', 'users'))
+        self.authorized_client.post(
+            reverse('posts:post_create'), data={'text': 'Свежий пост'}
+        )
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
+        self.assertEqual(get_generations(('groups', 'users')), shared)
+
+    def test_session_bypasses_cache(self):
+        self.guest_client.get(reverse('posts:index'))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotIn('ETag', response)
+        self.assertContains(response, 'Пользователь: auth')
+
+
+class PostDetailCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(PostDetailCacheTest.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(PostDetailCacheTest.reader)
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+
+    def test_shared_entry_skips_post_queries(self):
+        self.author_client.get(self.detail_url)
+        # Остаются только сессия и пользователь запроса
+        with self.assertNumQueries(2):
+            response = self.reader_client.get(self.detail_url)
+        self.assertFalse(response.context['is_author'])
+        self.assertEqual(response.context['one_post'], self.post)
+
+    def test_edit_comment_and_profile_refresh_entry(self):
+        self.reader_client.get(self.detail_url)
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            {'text': 'Исправленный пост'}
+        )
+        self.assertContains(
+            self.reader_client.get(self.detail_url), 'Исправленный пост'
+        )
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Свежий комментарий'}
+        )
+        self.assertContains(
+            self.reader_client.get(self.detail_url), 'Свежий комментарий'
+        )
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Лев'
+        author.save()
+        self.assertContains(
+            self.reader_client.get(self.detail_url), 'Автор: Лев'
+        )
+
+    def test_missing_post(self):
+        response = self.reader_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class StalePageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Старый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(StalePageTest.user)
+
+    def lock_database(self):
+        return mock.patch(
+            'posts.views.paginate',
+            side_effect=OperationalError('database is locked')
+        )
+
+    def test_guest_gets_stale_page_when_database_fails(self):
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.create(author=self.user, text='Новый пост')
+        with self.lock_database(), self.assertLogs(level='WARNING'):
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Старый пост')
+        self.assertNotContains(response, 'Новый пост')
+        self.assertEqual(response['Warning'], FAILED_WARNING)
+
+    def test_user_gets_stale_feed_when_database_fails(self):
+        self.authorized_client.get(reverse('posts:index'))
+        bump('index')
+        with self.lock_database(), self.assertLogs(level='WARNING'):
+            response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Старый пост')
+        self.assertEqual(response['Warning'], FAILED_WARNING)
+
+    @override_settings(CACHE_REFRESH_BUDGET=0.05)
+    def test_slow_count_is_cut_by_budget(self):
+        slow = (
+            'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL '
+            'SELECT i + 1 FROM n WHERE i < 100000000) SELECT COUNT(*) FROM n'
+        )
+
+        def paginate(*args):
+            with connection.cursor() as cursor:
+                cursor.execute(slow)
+
+        self.guest_client.get(reverse('posts:index'))
+        bump('index')
+        with mock.patch('posts.views.paginate', paginate):
+            with self.assertLogs(level='WARNING'):
+                response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Старый пост')
+        self.assertEqual(response['Warning'], FAILED_WARNING)
+
+    def test_failure_without_stale_copy_is_an_error(self):
+        with self.lock_database(), self.assertLogs(level='WARNING'):
+            with self.assertRaises(OperationalError):
+                self.authorized_client.get(reverse('posts:index'))
+
+    def test_expired_page_is_served_then_refreshed(self):
+        comment = Comment.objects.create(
+            author=self.user, post=self.post, text='Старый комментарий'
+        )
+        url = reverse('posts:comment_list', kwargs={'post_id': self.post.pk})
+        self.guest_client.get(url)
+        key = PAGE_KEY.format(hashlib.md5(url.encode()).hexdigest())
+        response, *entry = cache.get(key)
+        entry[2] = 0
+        cache.set(key, (response, *entry))
+        # Правка в обход сигналов: поколения прежние, запись лишь старая
+        Comment.objects.filter(pk=comment.pk).update(text='Новый комментарий')
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Старый комментарий')
+        self.assertEqual(response['Warning'], STALE_WARNING)
+        # Клиент закрыл ответ - обновление уже выполнено
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Новый комментарий')
+        self.assertFalse(response.has_header('Warning'))
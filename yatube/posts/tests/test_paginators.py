@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from posts.paginators import (
+    ELLIPSIS, CursorPaginator, decode_cursor, elided_page_range, encode_cursor
+)
+
+User = get_user_model()
+NUM_PAGE = 10
+
+
+@override_settings(CURSOR_PAGINATION=True)
+class CursorPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            [Post(author=cls.user, text=f'Тестовый пост {i}')
+             for i in range(23)]
+        )
+        cls.posts = list(Post.objects.order_by('-pub_date', '-id'))
+        cls.post_ids = [post.pk for post in cls.posts]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def get_page(self, query=''):
+        response = self.guest_client.get(reverse('posts:index') + query)
+        return response.context['page_obj']
+
+    def pks(self, page):
+        return [post.pk for post in page]
+
+    def test_cursor_round_trip(self):
+        post = self.posts[0]
+        self.assertEqual(
+            decode_cursor(encode_cursor(post.pub_date, post.pk)),
+            (post.pub_date, post.pk)
+        )
+
+    def test_walk_forward_and_back(self):
+        """Страницы по ?after= и ?before= не пересекаются и не теряют посты."""
+        first = self.get_page()
+        self.assertTrue(first.is_cursor)
+        self.assertFalse(first.has_previous())
+        self.assertEqual(self.pks(first), self.post_ids[:NUM_PAGE])
+        second = self.get_page(f'?after={first.next_cursor}')
+        self.assertEqual(
+            self.pks(second), self.post_ids[NUM_PAGE:2 * NUM_PAGE]
+        )
+        third = self.get_page(f'?after={second.next_cursor}')
+        self.assertEqual(self.pks(third), self.post_ids[2 * NUM_PAGE:])
+        self.assertFalse(third.has_next())
+        back = self.get_page(f'?before={third.previous_cursor}')
+        self.assertEqual(self.pks(back), self.pks(second))
+        self.assertTrue(back.has_previous())
+        back = self.get_page(f'?before={back.previous_cursor}')
+        self.assertEqual(self.pks(back), self.pks(first))
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        page = self.get_page('?after=not-a-cursor')
+        self.assertEqual(self.pks(page), self.post_ids[:NUM_PAGE])
+
+    def test_no_count_query(self):
+        """Курсорная страница не выполняет COUNT(*)."""
+        first = self.get_page()
+        with self.assertNumQueries(1):
+            page = CursorPaginator(Post.objects.all(), NUM_PAGE).get_page(
+                after=first.next_cursor
+            )
+            self.assertEqual(len(page), NUM_PAGE)
+
+
+class ElidedPageRangeTest(TestCase):
+    def page_range(self, number, num_pages):
+        page = Paginator(range(num_pages), 1).page(number)
+        return list(elided_page_range(page))
+
+    def test_short_range_is_not_elided(self):
+        self.assertEqual(self.page_range(3, 7), [1, 2, 3, 4, 5, 6, 7])
+
+    def test_window_around_current_page(self):
+        self.assertEqual(
+            self.page_range(2500, 5000),
+            [1, ELLIPSIS, 2498, 2499, 2500, 2501, 2502, ELLIPSIS, 5000]
+        )
+        self.assertEqual(
+            self.page_range(2, 5000), [1, 2, 3, 4, ELLIPSIS, 5000]
+        )
+        self.assertEqual(
+            self.page_range(5000, 5000), [1, ELLIPSIS, 4998, 4999, 5000]
+        )
+
+    def test_rendered_links_are_bounded(self):
+        user = get_user_model().objects.create_user(username='many')
+        Post.objects.bulk_create(
+            [Post(author=user, text=f'Пост {i}') for i in range(300)]
+        )
+        cache.clear()
+        response = Client().get(reverse('posts:index'), {'page': 15})
+        self.assertContains(response, 'page=15', count=0)
+        self.assertContains(response, 'page=14')
+        self.assertContains(response, 'page=30')
+        self.assertNotContains(response, 'page=20"')
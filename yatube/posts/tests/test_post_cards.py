@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post
+from posts.templatetags.post_cards import post_cards
+
+User = get_user_model()
+
+
+class PostCardsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='auth', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(PostCardsTest.user)
+
+    def card(self):
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk
+        )
+        [(_, card)] = post_cards([post])
+        return card
+
+    def test_cards_fetched_with_one_get_many(self):
+        self.card()
+        with mock.patch.object(
+            cache, 'get_many', wraps=cache.get_many
+        ) as get_many:
+            card = self.card()
+        # Первый get_many - поколения, второй - все карточки страницы
+        self.assertEqual(get_many.call_count, 2)
+        self.assertIn('Тестовый пост', card)
+
+    def test_card_refreshed_after_post_edit(self):
+        self.card()
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Отредактированный пост', 'group': self.group.pk},
+        )
+        self.assertIn('Отредактированный пост', self.card())
+
+    def test_card_refreshed_after_author_change(self):
+        self.card()
+        self.user.first_name = 'Фёдор'
+        self.user.save()
+        self.assertIn('Фёдор Толстой', self.card())
+
+    def test_card_refreshed_after_group_change(self):
+        self.card()
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertIn('Новое название', self.card())
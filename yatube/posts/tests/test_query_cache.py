@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.shortcuts import get_object_or_404
+from django.test import TransactionTestCase
+
+from core.cache import get_generations
+from core.querycache import cached
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+# Кэш выборок работает только вне транзакций, поэтому TransactionTestCase
+class QueryCacheTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='-'
+        )
+
+    def test_model_lookups_are_cached(self):
+        Group.objects.get(slug='group')
+        list(Group.objects.values_list('slug', flat=True))
+        with self.assertNumQueries(0):
+            self.assertEqual(Group.objects.get(slug='group'), self.group)
+            self.assertEqual(
+                list(Group.objects.values_list('slug', flat=True)),
+                ['group']
+            )
+
+    def test_any_write_to_table_invalidates(self):
+        Group.objects.get(slug='group')
+        Group.objects.filter(pk=self.group.pk).update(title='Новая')
+        self.assertEqual(Group.objects.get(slug='group').title, 'Новая')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE posts_group SET title = %s', ['Сырой SQL']
+            )
+        self.assertEqual(Group.objects.get(slug='group').title, 'Сырой SQL')
+
+    def test_joined_tables_invalidate(self):
+        by_author = Group.objects.filter(posts__author__username='auth')
+        self.assertEqual(list(by_author), [])
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        self.assertEqual(list(by_author.all()), [self.group])
+
+    def test_per_queryset_cache(self):
+        get_object_or_404(cached(User), username='auth')
+        with self.assertNumQueries(0):
+            get_object_or_404(cached(User), username='auth')
+        User.objects.filter(pk=self.user.pk).update(first_name='Имя')
+        self.assertEqual(
+            get_object_or_404(cached(User), username='auth').first_name,
+            'Имя'
+        )
+
+    def test_unwatched_tables_are_not_cached(self):
+        commented = Group.objects.filter(posts__comments__text='Текст')
+        list(commented)
+        with self.assertNumQueries(1):
+            list(commented.all())
+        with self.assertNumQueries(1):
+            list(Group.objects.uncached().filter(slug='group'))
+
+    def test_transactions_bypass_cache_and_bump_on_commit(self):
+        Group.objects.get(slug='group')
+        with transaction.atomic():
+            Group.objects.filter(pk=self.group.pk).update(title='Новая')
+            written, = get_generations(('table:posts_group',))
+            with self.assertNumQueries(1):
+                Group.objects.get(slug='group')
+        committed, = get_generations(('table:posts_group',))
+        self.assertGreater(committed, written)
+        self.assertEqual(Group.objects.get(slug='group').title, 'Новая')
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+from posts.rows import PostRow, post_rows
+
+User = get_user_model()
+
+
+@override_settings(FEED_READ_MODEL=True)
+class PostRowsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='auth', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='-'
+        )
+        cls.grouped = Post.objects.create(
+            author=cls.user, text='Пост в группе', group=cls.group
+        )
+        cls.plain = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_rows_render_like_posts(self):
+        for post in (self.grouped, self.plain):
+            with self.subTest(post=post.text):
+                row = post_rows(Post.objects.filter(pk=post.pk)).get()
+                self.assertEqual(
+                    render_to_string(
+                        'posts/includes/post_list.html', {'post': row}
+                    ),
+                    render_to_string(
+                        'posts/includes/post_list.html', {'post': post}
+                    )
+                )
+
+    def test_feeds_use_rows(self):
+        pages = {
+            reverse('posts:index'): [self.plain, self.grouped],
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}): [
+                self.grouped
+            ],
+            reverse('posts:profile', kwargs={'username': 'auth'}): [
+                self.plain, self.grouped
+            ],
+        }
+        for url, posts in pages.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                page = list(response.context['page_obj'])
+                self.assertTrue(
+                    all(isinstance(row, PostRow) for row in page)
+                )
+                self.assertEqual(
+                    [row.pk for row in page], [post.pk for post in posts]
+                )
+                self.assertContains(response, 'Лев Толстой')
+
+    def test_one_query_per_page(self):
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'Пост {i}') for i in range(12)]
+        )
+        with self.assertNumQueries(1):
+            list(post_rows(Post.objects.all())[:10])
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_pagination_over_rows(self):
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'Пост {i}') for i in range(12)]
+        )
+        url = reverse('posts:index')
+        first = self.guest_client.get(url).context['page_obj']
+        second = self.guest_client.get(
+            f'{url}?after={first.next_cursor}'
+        ).context['page_obj']
+        self.assertEqual(
+            [row.pk for row in list(first) + list(second)],
+            list(
+                Post.objects.order_by('-pub_date', '-id')
+                .values_list('pk', flat=True)
+            )
+        )
@@ -0,0 +1,84 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Коты, коты и ещё раз коты'
+        )
+        cls.cat = Post.objects.create(
+            author=cls.user, text='Один кот на фото'
+        )
+        cls.dog = Post.objects.create(author=cls.user, text='Собака')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def found(self, query, **params):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return list(response.context['page_obj'])
+
+    def test_ranked_prefix_search(self):
+        self.assertEqual(self.found('кот'), [self.cats, self.cat])
+        self.assertEqual(self.found('собак'), [self.dog])
+        self.assertEqual(self.found('кот фото'), [self.cat])
+
+    def test_index_follows_bulk_changes(self):
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'Попугай {i}') for i in range(3)]
+        )
+        self.assertEqual(len(self.found('попугай')), 3)
+        Post.objects.filter(pk=self.dog.pk).update(text='Щенок')
+        self.assertEqual(self.found('собака'), [])
+        Post.objects.get(pk=self.dog.pk).delete()
+        self.assertEqual(self.found('щенок'), [])
+
+    def test_query_syntax_is_not_executed(self):
+        self.assertEqual(self.found('"кот*'), [self.cats, self.cat])
+        self.assertEqual(self.found('кот OR собака'), [])
+        self.assertEqual(self.found('NEAR(***'), [])
+
+    def test_pagination_keeps_query(self):
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'Хомяк {i}') for i in range(12)]
+        )
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'хомяк'}
+        )
+        self.assertContains(
+            response, '?q=%D1%85%D0%BE%D0%BC%D1%8F%D0%BA&amp;page=2'
+        )
+        self.assertEqual(len(self.found('хомяк', page=2)), 2)
+
+    def test_admin_search_uses_index(self):
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кот'}
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list), {self.cats, self.cat}
+        )
+
+    def test_rebuild_command(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('кот'), [self.cats, self.cat])
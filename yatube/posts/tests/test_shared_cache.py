@@ -0,0 +1,185 @@
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from core import cache as shared
+from core.cache import (
+    GENERATION_KEY, LOCK_KEY, bump_on_commit, fetch, get_generations,
+    latency_budget, request_scope
+)
+
+KEY = 'test:fetch'
+
+
+class FetchTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, value):
+        def compute():
+            self.calls.append(value)
+            return value
+        return compute
+
+    def test_read_through(self):
+        self.assertEqual(fetch(KEY, self.compute('a'), 60, version=1), 'a')
+        self.assertEqual(fetch(KEY, self.compute('b'), 60, version=1), 'a')
+        self.assertEqual(fetch(KEY, self.compute('c'), 60, version=2), 'c')
+        self.assertEqual(self.calls, ['a', 'c'])
+
+    def test_stale_value_served_while_other_worker_rebuilds(self):
+        fetch(KEY, self.compute('old'), 60, version=1)
+        cache.add(LOCK_KEY.format(KEY), True)
+        self.assertEqual(fetch(KEY, self.compute('new'), 60, version=2), 'old')
+        self.assertEqual(self.calls, ['old'])
+
+    @mock.patch.object(shared, 'LOCK_TIMEOUT', 0.2)
+    def test_stale_value_older_than_not_before_is_not_served(self):
+        fetch(KEY, self.compute('old'), 60, version=1)
+        cache.add(LOCK_KEY.format(KEY), True)
+        self.assertEqual(
+            fetch(KEY, self.compute('new'), 60, version=2,
+                  not_before=shared.time.time()),
+            'new'
+        )
+
+    def test_same_version_older_than_not_before_is_recomputed(self):
+        fetch(KEY, self.compute('old'), 60, version=1)
+        self.assertEqual(
+            fetch(KEY, self.compute('new'), 60, version=1,
+                  not_before=shared.time.time()),
+            'new'
+        )
+
+    def test_early_recompute_before_expiry(self):
+        fetch(KEY, self.compute('a'), 60, version=1)
+        value, version, computed, expires, _ = cache.get(KEY)
+        # Долгий расчёт делает досрочный пересчёт почти неизбежным
+        cache.set(KEY, (value, version, computed, expires, 10 ** 6))
+        self.assertEqual(fetch(KEY, self.compute('b'), 60, version=1), 'b')
+
+    def expire(self):
+        """Переводит запись за мягкий срок, оставляя её в кэше."""
+        value, version, computed, _, delta = cache.get(KEY)
+        cache.set(KEY, (value, version, computed, 0, delta))
+
+    def test_stale_while_revalidate(self):
+        fetch(KEY, self.compute('old'), 60, version=1)
+        self.expire()
+        with request_scope() as state:
+            self.assertEqual(
+                fetch(KEY, self.compute('new'), 60, version=1), 'old'
+            )
+        self.assertTrue(state.stale)
+        self.assertEqual(self.calls, ['old'])
+        for refresh in state.refreshes.values():
+            refresh()
+        self.assertEqual(fetch(KEY, self.compute('x'), 60, version=1), 'new')
+
+    def test_stale_if_error(self):
+        fetch(KEY, self.compute('old'), 60, version=1)
+
+        def locked():
+            raise OperationalError('database is locked')
+
+        with request_scope() as state, self.assertLogs('core.cache'):
+            self.assertEqual(fetch(KEY, locked, 60, version=2), 'old')
+        self.assertTrue(state.failed)
+        with self.assertRaises(OperationalError):
+            fetch('test:empty', locked, 60, version=2)
+
+    def test_uncacheable_value_is_not_stored(self):
+        fetch(KEY, self.compute(None), 60, cacheable=bool)
+        self.assertIsNone(cache.get(KEY))
+        self.assertIsNone(cache.get(LOCK_KEY.format(KEY)))
+
+
+class NearCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.shared = caches['shared']
+
+    def other_process_writes(self, key, value):
+        """Запись в L2 и журнал так, как её сделал бы другой воркер."""
+        self.shared.set(key, value)
+        connection = cache.near.bus._connection()
+        with connection:
+            connection.execute(
+                'INSERT INTO invalidation (pid, key, created) '
+                'VALUES (-1, ?, 0)',
+                [self.shared.make_key(key)]
+            )
+        cache.near.polled = 0
+
+    def test_hot_key_served_from_memory(self):
+        cache.set(KEY, 'value')
+        with mock.patch.object(self.shared, 'get') as shared_get:
+            self.assertEqual(cache.get(KEY), 'value')
+        shared_get.assert_not_called()
+
+    def test_copy_is_independent(self):
+        cache.set(KEY, ['value'])
+        cache.get(KEY).append('changed')
+        self.assertEqual(cache.get(KEY), ['value'])
+
+    def test_other_process_write_evicts_local_copy(self):
+        cache.set(KEY, 'old')
+        self.shared.set(KEY, 'new')
+        self.assertEqual(cache.get(KEY), 'old')
+        self.other_process_writes(KEY, 'new')
+        self.assertEqual(cache.get(KEY), 'new')
+
+    def test_write_reaches_shared_cache_before_publish(self):
+        cache.set(KEY, 1)
+        seen = []
+
+        def publish(keys):
+            seen.append(self.shared.get(KEY))
+
+        with mock.patch.object(cache.near, 'publish', publish):
+            cache.set(KEY, 2)
+            cache.incr(KEY)
+            cache.set_many({KEY: 5})
+            cache.delete(KEY)
+        self.assertEqual(seen, [2, 3, 5, None])
+
+    def test_bump_reaches_local_copies(self):
+        generation, = get_generations(('index',))
+        self.other_process_writes(GENERATION_KEY.format('index'), 1.0)
+        self.assertNotEqual(get_generations(('index',)), [generation])
+
+
+class LatencyBudgetTest(TestCase):
+    def test_slow_query_is_interrupted(self):
+        slow = (
+            'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL '
+            'SELECT i + 1 FROM n WHERE i < 100000000) SELECT COUNT(*) FROM n'
+        )
+        with self.assertRaises(OperationalError):
+            with latency_budget(0.05), connection.cursor() as cursor:
+                cursor.execute(slow)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+class BumpOnCommitTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_scopes_bumped_again_after_commit(self):
+        with transaction.atomic():
+            bump_on_commit('test')
+            written, = get_generations(('test',))
+        committed, = get_generations(('test',))
+        self.assertGreater(committed, written)
+
+    def test_rolled_back_bump_is_not_repeated(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                bump_on_commit('test')
+                written, = get_generations(('test',))
+                raise RuntimeError
+        self.assertEqual(get_generations(('test',)), [written])
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import counters
+from posts.models import ImageBlob, Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(
+            os.path.join(TEMP_MEDIA_ROOT, 'posts'), ignore_errors=True
+        )
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, text, name):
+        self.client.post(reverse('posts:post_create'), data={
+            'text': text,
+            'image': SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        })
+        return Post.objects.get(text=text)
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), TEMP_MEDIA_ROOT)
+            for root, _, names in os.walk(os.path.join(TEMP_MEDIA_ROOT,
+                                                       'posts'))
+            for name in names
+        )
+
+    def test_same_bytes_stored_once(self):
+        first = self.upload('Первый', 'one.gif')
+        second = self.upload('Второй', 'two.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.files(), [first.image.name])
+        self.assertEqual(ImageBlob.objects.get(name=first.image.name).refs, 2)
+
+    def test_file_deleted_with_last_reference(self):
+        first = self.upload('Первый', 'one.gif')
+        second = self.upload('Второй', 'two.gif')
+        name = first.image.name
+        first.delete()
+        counters.collect_image(name)
+        self.assertEqual(self.files(), [name])
+        second.delete()
+        counters.collect_image(name)
+        self.assertEqual(self.files(), [])
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_upload_after_collect_rewrites_file(self):
+        """Загрузка, дождавшаяся блокировки после collect_image, не
+        ссылается на удалённый файл."""
+        first = self.upload('Первый', 'one.gif')
+        name = first.image.name
+        first.delete()
+        lock_image = counters.lock_image
+
+        def collect_then_lock(name):
+            counters.collect_image(name)
+            lock_image(name)
+
+        with mock.patch.object(counters, 'lock_image', collect_then_lock):
+            second = self.upload('Второй', 'two.gif')
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(self.files(), [name])
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 1)
+
+    def test_dedupe_media_command(self):
+        posts_dir = os.path.join(TEMP_MEDIA_ROOT, 'posts')
+        os.makedirs(posts_dir, exist_ok=True)
+        for name in ('a.gif', 'b.gif'):
+            with open(os.path.join(posts_dir, name), 'wb') as file:
+                file.write(SMALL_GIF)
+        Post.objects.bulk_create([
+            Post(author=self.user, text='А', image='posts/a.gif'),
+            Post(author=self.user, text='Б', image='posts/b.gif'),
+        ])
+        call_command('dedupe_media', stdout=StringIO())
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertEqual(self.files(), [name])
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 2)
@@ -0,0 +1,181 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
+
+from posts import kvstore, thumbnails
+from posts.models import Post, ThumbnailJob
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+GEOMETRY = thumbnails.geometry(thumbnails.DEFAULT_WIDTH)
+OPTIONS = {
+    'crop': 'center',
+    'upscale': True,
+    'format': thumbnails.IMAGE_FORMATS[-1][0],
+}
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class DeferredThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        kvstore.local.clear()
+        self.guest_client = Client()
+
+    def detail(self):
+        return self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+
+    def test_render_does_not_resize(self):
+        """Без готовой миниатюры страница получает заглушку."""
+        with mock.patch.object(thumbnails.ThumbnailBackend,
+                               '_create_thumbnail') as create:
+            response = self.detail()
+        create.assert_not_called()
+        self.assertContains(response, 'src="data:image/svg+xml,')
+        self.assertIsInstance(
+            get_thumbnail(self.post.image, GEOMETRY, **OPTIONS),
+            thumbnails.Placeholder
+        )
+
+    def test_worker_replaces_placeholder(self):
+        self.detail()
+        self.assertTrue(ThumbnailJob.objects.filter(
+            source=self.post.image.name, geometry=GEOMETRY
+        ).exists())
+        call_command(
+            'thumbnail_worker', once=True, workers=0, stdout=StringIO()
+        )
+        self.assertFalse(ThumbnailJob.objects.exists())
+        thumbnail = get_thumbnail(self.post.image, GEOMETRY, **OPTIONS)
+        self.assertNotIsInstance(thumbnail, thumbnails.Placeholder)
+        self.assertEqual(tuple(thumbnail.size), (960, 339))
+        response = self.detail()
+        self.assertContains(response, f'src="{thumbnail.url}"')
+        for width in thumbnails.RESPONSIVE_WIDTHS:
+            self.assertContains(response, f' {width}w')
+        self.assertContains(response, f'sizes="{thumbnails.IMAGE_SIZES}"')
+
+    def test_save_enqueues_all_sizes(self):
+        ThumbnailJob.objects.all().delete()
+        post = Post.objects.get(pk=self.post.pk)
+        # Другой цвет палитры - другой файл в хранилище по содержимому
+        post.image = SimpleUploadedFile(
+            'red.gif', SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\xFF\x00\x00'),
+            content_type='image/gif'
+        )
+        post.save()
+        self.assertEqual(
+            ThumbnailJob.objects.count(), len(thumbnails.THUMBNAIL_SPECS)
+        )
+
+    def test_text_edit_does_not_enqueue(self):
+        ThumbnailJob.objects.all().delete()
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertFalse(ThumbnailJob.objects.exists())
+
+    def test_page_views_enqueue_once(self):
+        ThumbnailJob.objects.all().delete()
+        self.detail()
+        with mock.patch.object(
+            ThumbnailJob.objects, 'bulk_create'
+        ) as bulk_create:
+            self.guest_client.get(
+                reverse('posts:profile', kwargs={'username': self.user})
+            )
+        bulk_create.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailLookupTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user,
+                text=f'Пост {i}',
+                image=SimpleUploadedFile(
+                    f'small{i}.gif', SMALL_GIF, content_type='image/gif'
+                ),
+            )
+            for i in range(5)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        kvstore.local.clear()
+
+    def kvstore_queries(self, queries):
+        return [
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+
+    def test_one_query_per_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        self.assertEqual(len(self.kvstore_queries(queries)), 1)
+
+    def test_lru_serves_prefetched_thumbnails(self):
+        call_command(
+            'thumbnail_worker', once=True, workers=0, stdout=StringIO()
+        )
+        cache.clear()
+        kvstore.local.clear()
+        thumbnails.prefetch(post.image for post in self.posts)
+        with mock.patch.object(caches['default'], 'get') as get:
+            with CaptureQueriesContext(connection) as queries:
+                for post in self.posts:
+                    self.assertNotIsInstance(
+                        get_thumbnail(post.image, GEOMETRY, **OPTIONS),
+                        thumbnails.Placeholder
+                    )
+        get.assert_not_called()
+        self.assertEqual(len(queries), 0)
@@ -1,18 +1,25 @@
+import shutil
+import tempfile
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 
+from core.cache import GENERATION_KEY
 from posts.models import Post, Group, Comment
 from posts.forms import PostForm, CommentForm
 
 User = get_user_model()
 NUM_POST = 3
 NUM_PAGE = 10
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostModelTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -52,6 +59,11 @@ class PostModelTest(TestCase):
             description='Тестовое описание 2',
         )
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
     def setUp(self):
         self.guest_client = Client()
         self.user = User.objects.create_user(username='HasNoName')
@@ -101,14 +113,17 @@ class PostModelTest(TestCase):
         t_text = first_object.text
         t_group = first_object.group
         t_image = first_object.image
-        self.assertEqual(t_author, PostModelTest.user)
+        self.assertEqual(
+            (t_author.pk, t_author.get_full_name()),
+            (PostModelTest.user.pk, PostModelTest.user.get_full_name())
+        )
         self.assertEqual(
             t_text,
             self.post.text
         )
         self.assertEqual(
-            t_group,
-            self.post.group
+            (t_group.pk, t_group.slug),
+            (self.post.group.pk, self.post.group.slug)
         )
         self.assertEqual(
             t_image,
@@ -140,11 +155,14 @@ class PostModelTest(TestCase):
             t_text,
             self.post.text
         )
-        self.assertEqual(t_author, PostModelTest.user)
+        self.assertEqual(
+            (t_author.pk, t_author.get_full_name()),
+            (PostModelTest.user.pk, PostModelTest.user.get_full_name())
+        )
         self.assertEqual(t_slug, self.group.slug)
         self.assertEqual(
-            t_group,
-            self.post.group
+            (t_group.pk, t_group.slug),
+            (self.post.group.pk, self.post.group.slug)
         )
         self.assertEqual(
             t_image,
@@ -183,24 +201,24 @@ class PostModelTest(TestCase):
             t_text,
             self.post.text
         )
-        self.assertEqual(t_author, PostModelTest.user)
         self.assertEqual(
-            t_group,
-            self.post.group
+            (t_author.pk, t_author.get_full_name()),
+            (PostModelTest.user.pk, PostModelTest.user.get_full_name())
+        )
+        self.assertEqual(
+            (t_group.pk, t_group.slug),
+            (self.post.group.pk, self.post.group.slug)
         )
         self.assertEqual(
             response.context.get('author'),
             PostModelTest.user
         )
         self.assertQuerysetEqual(
-            response.context.get('posts'),
+            response.context['page_obj'],
             Post.objects.filter(
                 author=PostModelTest.user
-            ).select_related(
-                'author',
-                'group'
-            ),
-            transform=lambda x: x
+            ).values_list('pk', flat=True),
+            transform=lambda x: x.pk
         )
         self.assertEqual(
             response.context.get('title'),
@@ -439,7 +457,9 @@ class PostModelTest(TestCase):
             self.post.text
         )
         self.assertNotEqual(t_slug, PostModelTest.group.slug)
-        self.assertNotEqual(t_image, PostModelTest.post.image)
+        self.assertNotEqual(first_object.pk, PostModelTest.post.pk)
+        # Одинаковые картинки хранятся одним файлом
+        self.assertEqual(t_image.name, PostModelTest.post.image.name)
 
         self.assertNotEqual(
             t_group,
@@ -471,9 +491,56 @@ class PostModelTest(TestCase):
 
     def test_cashe(self):
         response = self.authorized_client.get(reverse('posts:index'))
-        Post.objects.all().delete()
+        # Изменение в обход сигналов не сбрасывает кэш
+        Post.objects.update(text='Изменённый текст')
         response1 = self.authorized_client.get(reverse('posts:index'))
         cache.clear()
         response2 = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response.content, response1.content)
         self.assertNotEqual(response2.content, response1.content)
+
+    def test_cache_invalidated_on_delete(self):
+        response = self.authorized_client.get(reverse('posts:index'))
+        Post.objects.all().delete()
+        response1 = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotEqual(response.content, response1.content)
+
+    def test_cache_key_depends_on_page(self):
+        cache.clear()
+        Post.objects.bulk_create(
+            [Post(
+                author=PostModelTest.user,
+                text=f'Тестовый пост {i}',
+                group=self.group,
+            ) for i in range(12)]
+        )
+        response1 = self.authorized_client.get(reverse('posts:index'))
+        response2 = self.authorized_client.get(
+            reverse('posts:index') + '?page=2'
+        )
+        self.assertNotEqual(response1.content, response2.content)
+        self.assertNotContains(response2, 'Тестовый пост 11<')
+
+    def test_new_post_visible_to_author(self):
+        cache.clear()
+        self.authorized_client.get(reverse('posts:index'))
+        self.authorized_client.post(
+            reverse('posts:post_create'), data={'text': 'Свежий пост'}
+        )
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
+
+    def test_new_post_visible_to_author_in_other_worker(self):
+        """Кэш другого процесса, не видевший поста, не прячет его
+        от автора."""
+        cache.clear()
+        self.authorized_client.get(reverse('posts:index'))
+        stale = cache.get(GENERATION_KEY.format('index'))
+        self.authorized_client.post(
+            reverse('posts:post_create'), data={'text': 'Свежий пост'}
+        )
+        cache.set(GENERATION_KEY.format('index'), stale, None)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Свежий пост')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
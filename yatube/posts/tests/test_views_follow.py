@@ -2,6 +2,7 @@ from django.contrib.auth import get_user_model
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.core.cache import cache
+from django.db import IntegrityError, transaction
 
 from posts.models import Post, Follow
 
@@ -82,3 +83,21 @@ class FollowTest(TestCase):
             reverse('posts:follow_index'))
         self.assertNotIn(
             self.post, response_after_following2.context.get('posts'))
+
+    def test_follow_is_unique(self):
+        Follow.objects.create(
+            user=self.user_who_follows_author, author=self.user
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(
+                user=self.user_who_follows_author, author=self.user
+            )
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': self.user})
+        )
+        self.assertEqual(
+            Follow.objects.filter(
+                user=self.user_who_follows_author, author=self.user
+            ).count(),
+            1
+        )
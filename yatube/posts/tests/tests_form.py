@@ -1,4 +1,3 @@
-import os
 import shutil
 import tempfile
 
@@ -84,18 +83,18 @@ class PostCreateFormTests(TestCase):
             )
         )
         self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(
-            Post.objects.filter(
-                text='Тестовый пост 1',
-                group=PostCreateFormTests.group.id,
-                author=PostCreateFormTests.user,
-                image='posts/small.gif'
-            ).exists()
+        post = Post.objects.get(
+            text='Тестовый пост 1',
+            group=PostCreateFormTests.group.id,
+            author=PostCreateFormTests.user,
+        )
+        # Картинка хранится под хэшем содержимого
+        self.assertRegex(
+            post.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
         )
         response = (self.authorized_client.get(reverse('posts:index')))
         self.assertEqual(
-            os.path.basename(response.context['posts'][0].image.name),
-            form_data['image'].name
+            response.context['page_obj'][0].image.name, post.image.name
         )
 
     def test_edit_post(self):
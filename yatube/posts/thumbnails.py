@@ -0,0 +1,232 @@
+"""Подготовка миниатюр Post.image вне веб-запросов.
+
+Тег {% thumbnail %} работает через DeferredThumbnailBackend: готовая
+миниатюра берётся из хранилища ключей sorl, а для недостающей в очередь
+ThumbnailJob ставится задача, и до её выполнения страница получает
+заглушку. Поэтому ни один веб-запрос не декодирует и не масштабирует
+картинки. Сохранение поста с новой картинкой ставит в очередь миниатюры
+всех размеров из THUMBNAIL_SPECS, а строит их пул потоков команды
+thumbnail_worker.
+"""
+import json
+import logging
+from hashlib import md5
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.db import connection
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import DummyImageFile, ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from core.cache import bump
+
+from .models import Post, ThumbnailJob
+
+# Ширины производных Post.image для srcset; пропорции кадра 960x339
+RESPONSIVE_WIDTHS = (480, 720, 960, 1440)
+ASPECT = (960, 339)
+# Ширина <img src> для браузеров без srcset и подсказка sizes
+DEFAULT_WIDTH = 960
+IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+# Форматы производных по убыванию выгоды; последний понимают все браузеры
+IMAGE_FORMATS = tuple(
+    (fmt, content_type)
+    for fmt, content_type in (('WEBP', 'image/webp'), ('JPEG', 'image/jpeg'))
+    if fmt != 'WEBP' or features.check('webp')
+)
+
+
+def geometry(width):
+    return f'{width}x{round(width * ASPECT[1] / ASPECT[0])}'
+
+
+# Размеры и опции всех миниатюр, которые показывают шаблоны
+THUMBNAIL_SPECS = tuple(
+    (geometry(width), {'crop': 'center', 'upscale': True, 'format': fmt})
+    for fmt, _ in IMAGE_FORMATS
+    for width in RESPONSIVE_WIDTHS
+)
+PLACEHOLDER_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}" '
+    'viewBox="0 0 {0} {1}"><rect width="100%" height="100%" '
+    'fill="#e9ecef"/></svg>'
+)
+
+# Сколько секунд страницы не ставят в очередь уже поставленную миниатюру
+ENQUEUE_THROTTLE = 60
+
+logger = logging.getLogger(__name__)
+
+
+class Placeholder(DummyImageFile):
+    """Серая заглушка размера миниатюры в виде data URI."""
+
+    @property
+    def url(self):
+        return 'data:image/svg+xml,' + quote(
+            PLACEHOLDER_SVG.format(self.x, self.y)
+        )
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Отдаёт только готовые миниатюры, остальные ставит в очередь."""
+
+    def prepare_options(self, source, options):
+        """Дополняет опции так же, как ThumbnailBackend.get_thumbnail,
+        чтобы имя миниатюры совпало с тем, что построит воркер."""
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, source, geometry_string, options):
+        """Файл миниатюры, которую для source построит ThumbnailBackend."""
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self.prepare_options(
+                source, dict(options)
+            )
+        )
+        return ImageFile(name, default.storage)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        cached = default.kvstore.get(
+            self.thumbnail_file(source, geometry_string, options)
+        )
+        if cached:
+            return cached
+        enqueue(source.name, geometry_string, options, throttle=True)
+        return Placeholder(geometry_string)
+
+
+def derivatives(image):
+    """Готовые производные картинки для <picture>.
+
+    Возвращает источники по форматам и запасной <img> последнего формата;
+    ещё не построенные размеры пропускаются и ставятся в очередь. Пока не
+    готов ни один размер запасного формата, img - заглушка.
+    """
+    backend = default.backend
+    sources = []
+    for fmt, content_type in IMAGE_FORMATS:
+        ready = []
+        for width in RESPONSIVE_WIDTHS:
+            thumbnail = backend.get_thumbnail(
+                image, geometry(width), crop='center', upscale=True,
+                format=fmt,
+            )
+            if not isinstance(thumbnail, Placeholder):
+                ready.append((width, thumbnail))
+        sources.append({
+            'type': content_type,
+            'ready': ready,
+            'srcset': ', '.join(
+                f'{thumbnail.url} {width}w' for width, thumbnail in ready
+            ),
+        })
+    fallback = sources.pop()
+    if not fallback['ready']:
+        return {
+            'img': Placeholder(geometry(DEFAULT_WIDTH)),
+            'sources': [],
+        }
+    img = fallback['ready'][0][1]
+    for width, thumbnail in fallback['ready']:
+        if width <= DEFAULT_WIDTH:
+            img = thumbnail
+    return {
+        'img': img,
+        'srcset': fallback['srcset'],
+        'sizes': IMAGE_SIZES,
+        'sources': [source for source in sources if source['ready']],
+    }
+
+
+def prefetch(images):
+    """Загружает метаданные миниатюр картинок страницы одним пакетом."""
+    backend = DeferredThumbnailBackend()
+    default.kvstore.prefetch([
+        add_prefix(backend.thumbnail_file(
+            ImageFile(image), geometry_string, options
+        ).key)
+        for image in images if image
+        for geometry_string, options in THUMBNAIL_SPECS
+    ])
+
+
+def enqueue(name, geometry_string, options, throttle=False):
+    """Ставит миниатюру в очередь; повторная постановка ничего не меняет.
+
+    Со страниц задача ставится не чаще раза в ENQUEUE_THROTTLE секунд,
+    чтобы просмотры поста без миниатюры не писали в базу на каждый запрос.
+    """
+    options = json.dumps(options, sort_keys=True)
+    key = md5(f'{name}|{geometry_string}|{options}'.encode()).hexdigest()
+    if throttle and not cache.add(
+        f'thumbnail_job:{key}', True, ENQUEUE_THROTTLE
+    ):
+        return
+    ThumbnailJob.objects.bulk_create(
+        [ThumbnailJob(source=name, geometry=geometry_string, options=options)],
+        ignore_conflicts=True,
+    )
+
+
+def pregenerate(image):
+    """Ставит в очередь миниатюры картинки во всех размерах шаблонов."""
+    for geometry_string, options in THUMBNAIL_SPECS:
+        enqueue(image.name, geometry_string, options)
+
+
+def refresh_pages(name):
+    """Сбрасывает кэш страниц с постами, где заглушку пора заменить."""
+    posts = Post.objects.filter(image=name).values_list(
+        'pk', 'author_id', 'group_id'
+    )
+    for pk, author_id, group_id in posts:
+        scopes = ['index', f'post:{pk}', f'profile:{author_id}']
+        if group_id:
+            scopes.append(f'group:{group_id}')
+        bump(*scopes)
+
+
+def generate(job):
+    """Строит миниатюру задачи и снимает задачу с очереди.
+
+    Задача с ошибкой тоже снимается, чтобы битая картинка не занимала
+    воркеры; её заново поставит в очередь следующий просмотр страницы.
+    """
+    try:
+        # Ключ sorl зависит от хранилища: берём то же, что у Post.image
+        source = ImageFile(
+            job.source, Post._meta.get_field('image').storage
+        )
+        ThumbnailBackend().get_thumbnail(
+            source, job.geometry, **json.loads(job.options)
+        )
+        refresh_pages(job.source)
+    except Exception:
+        logger.exception(
+            'Миниатюра %s %s не построена', job.source, job.geometry
+        )
+    ThumbnailJob.objects.filter(pk=job.pk).delete()
+
+
+def work(job):
+    """Задача пула потоков: у потока своё соединение с базой."""
+    try:
+        generate(job)
+    finally:
+        connection.close()
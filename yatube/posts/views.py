@@ -1,22 +1,107 @@
+import logging
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import DatabaseError
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404, redirect
 
-from .models import Post, Group, User, Follow
+from core.cache import (
+    FragmentKey, fetch, get_generations, latency_budget
+)
+from core.decorators import cache_anonymous_page
+from core.querycache import cached
+
+from . import counters, feed, groups, rows, search
+from .authors import post_author_id
+from .models import Comment, Post, User, Follow
 from .forms import PostForm, CommentForm
+from .paginators import (
+    CursorPage, CursorPaginator, UnavailablePage, paginate
+)
 
 COUNT = 10
+# Комментариев на странице поста и в каждой догружаемой порции
+COMMENTS_COUNT = 20
+POST_DETAIL_KEY = 'post_detail:{}'
+POST_DETAIL_TIMEOUT = 60 * 60 * 24
+# Время последнего поста пользователя: его страницы не должны быть старше
+FRESH_SESSION_KEY = 'posts_fresh_since'
+
+logger = logging.getLogger(__name__)
+
+
+def page_cache_key(request, page_obj, scope):
+    """Ключ фрагмента ленты: область и страница, версия - поколения
+    области, групп и пользователей. Автору недавнего поста не отдаётся
+    фрагмент, нарисованный раньше этого поста."""
+    floor = request.session.get(FRESH_SESSION_KEY)
+    generations = get_generations((scope, 'groups', 'users'))
+    if getattr(page_obj, 'is_cursor', False):
+        page = 'after={}&before={}'.format(
+            request.GET.get('after', ''), request.GET.get('before', '')
+        )
+    else:
+        page = f'page={page_obj.number}'
+    return FragmentKey(f'{scope}:{page}', generations, floor)
+
+
+def paginate_or_stale(request, posts):
+    """Страница ленты; если БД недоступна или COUNT не уложился в
+    CACHE_REFRESH_BUDGET, лента берётся из устаревшего фрагмента кэша, а
+    без него запрос падает с исходной ошибкой."""
+    try:
+        with latency_budget(settings.CACHE_REFRESH_BUDGET):
+            return paginate(request, posts, COUNT)
+    except DatabaseError as error:
+        logger.warning('Лента из кэша: БД недоступна', exc_info=True)
+        return UnavailablePage(request, error)
+
+
+def feed_posts(posts):
+    """Посты ленты для карточек: модели или, при FEED_READ_MODEL, строки
+    PostRow только с показываемыми колонками."""
+    if settings.FEED_READ_MODEL:
+        return rows.post_rows(posts)
+    return posts.select_related('author', 'group')
+
 
+def index_scopes(request):
+    return ('index', 'groups', 'users')
 
+
+def group_scopes(request, slug):
+    group = groups.get_by_slug(slug)
+    group_id = group.pk if group is not None else None
+    return (f'group:{group_id}', 'groups', 'users')
+
+
+def profile_scopes(request, username):
+    author_id = cached(User).filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    return (f'profile:{author_id}', 'groups', 'users')
+
+
+def post_scopes(request, post_id):
+    author_id = post_author_id(post_id)
+    return (f'post:{post_id}', f'profile:{author_id}', 'groups', 'users')
+
+
+@cache_anonymous_page(group_scopes)
 def group_list(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author', 'group')
-    paginator = Paginator(posts, COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group = groups.get_by_slug(slug)
+    if group is None:
+        raise Http404
+    posts = feed_posts(group.posts.all())
+    page_obj = paginate_or_stale(request, posts)
     title = 'Записи группы: ' + str(group)
     context = {
         'page_obj': page_obj,
+        'cache_key': page_cache_key(request, page_obj, f'group:{group.pk}'),
         'group': group,
         'title': title,
         'h1': group.title,
@@ -25,73 +110,161 @@ def group_list(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous_page(index_scopes)
 def index(request):
-    post_list = Post.objects.select_related('author', 'group')
-    paginator = Paginator(post_list, COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = feed_posts(Post.objects.all())
+    page_obj = paginate_or_stale(request, post_list)
     context = {
         'page_obj': page_obj,
-        'posts': post_list,
+        'cache_key': page_cache_key(request, page_obj, 'index'),
         'title': 'Последние обновления на сайте',
         'h1': 'Последние обновления на сайте',
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_anonymous_page(profile_scopes)
 def profile(request, username):
     # Здесь код запроса к модели и создание словаря контекста
-    author = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=author).select_related(
-        'author', 'group')
-    paginator = Paginator(post_list, COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(cached(User), username=username)
+    post_list = feed_posts(Post.objects.filter(author=author))
+    page_obj = paginate(request, post_list, COUNT)
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=author
     ).exists()
+    stats = counters.stats_for(author)
     context = {
         'author': author,
+        'author_stats': stats,
         'h1': 'Все посты пользователя ' + str(author.get_full_name()),
         'title': 'Профайл пользователя ' + str(author.get_full_name()),
         'page_obj': page_obj,
-        'h3': page_obj.paginator.count,
-        'posts': post_list,
+        'cache_key': page_cache_key(request, page_obj, f'profile:{author.pk}'),
+        'h3': stats.posts_count,
         'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+def comment_scopes(request, post_id):
+    return (f'post:{post_id}', 'users')
+
+
+def comments_page(post_id, after=None):
+    """Порция комментариев от новых к старым с авторами в том же
+    запросе; следующая порция начинается после курсора."""
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        COMMENTS_COUNT,
+        keys=('created', 'id'),
+    )
+    return paginator.get_page(after=after)
+
+
+def post_detail_data(post_id, not_before=None):
+    """Общая для всех читателей часть страницы поста: пост с автором и
+    группой, счётчики автора и первая порция комментариев.
+
+    Версия записи - поколения поста (правка, комментарии), автора
+    (профиль), его счётчиков и групп. Для несуществующего поста
+    возвращает None.
+    """
+    author_id = post_author_id(post_id)
+    if author_id is None:
+        return None
+    generations = get_generations((
+        f'post:{post_id}', f'user:{author_id}',
+        f'profile:{author_id}', 'groups'
+    ))
+
+    def load():
+        post = Post.objects.select_related('author', 'group').filter(
+            pk=post_id
+        ).first()
+        if post is None:
+            return None
+        comments = comments_page(post_id)
+        return {
+            'post': post,
+            'author_stats': counters.stats_for(post.author),
+            # Страница без paginator: queryset в кэш не кладётся
+            'comments': CursorPage(
+                list(comments), None, comments.next_cursor, None
+            ),
+        }
+
+    return fetch(
+        POST_DETAIL_KEY.format(post_id),
+        load,
+        POST_DETAIL_TIMEOUT,
+        version=generations,
+        not_before=not_before,
+        cacheable=lambda data: data is not None,
+    )
+
+
+@cache_anonymous_page(post_scopes)
 def post_detail(request, post_id):
-    one_post = get_object_or_404(Post, id=post_id)
-    comments = one_post.comments.all()
+    data = post_detail_data(
+        post_id, not_before=request.session.get(FRESH_SESSION_KEY)
+    )
+    if data is None:
+        raise Http404
+    one_post = data['post']
     form = CommentForm(request.POST or None)
-    is_author = request.user == one_post.author
+    is_author = request.user.pk == one_post.author_id
     context = {
         'one_post': one_post,
+        'author_stats': data['author_stats'],
         'title': one_post.text[:30],
         'is_author': is_author,
         'form': form,
-        'comments': comments,
+        'comments': data['comments'],
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@cache_anonymous_page(comment_scopes)
+def comment_list(request, post_id):
+    """Фрагмент страницы поста с более ранними комментариями."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    context = {
+        'post_id': post_id,
+        'comments': comments_page(post_id, request.GET.get('after')),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    results = search.search(query).select_related('author', 'group')
+    # Выдача упорядочена по релевантности, курсор по дате к ней не подходит
+    page_obj = Paginator(results, COUNT).get_page(request.GET.get('page'))
+    context = {
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+        'query': query,
+        'title': f'Поиск: {query}' if query else 'Поиск',
+        'h1': 'Поиск по записям',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     template = 'posts/create_post.html'
-    groups = Group.objects.all().order_by('title')
     context = {
         'title': 'Новый пост',
         'form': form,
-        'groups': groups,
     }
     if not form.is_valid():
         return render(request, template, context)
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    request.session[FRESH_SESSION_KEY] = time.time()
     return redirect('posts:profile', (request.user.username))
 
 
@@ -105,13 +278,11 @@ def post_edit(request, post_id):
         files=request.FILES or None,
         instance=post
     )
-    groups = Group.objects.all().order_by('title')
     context = {
         'title': 'Редактирование поста',
         'form': form,
         'is_edit': is_edit,
         'post': post,
-        'groups': groups,
     }
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
@@ -136,34 +307,38 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     # информация о текущем пользователе доступна в переменной request.user
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    source = feed.feed_for(request.user)
+    page_obj = feed.as_posts(
+        paginate(request, source, COUNT, keys=('pub_date', 'post_id'))
+    )
     context = {
         'page_obj': page_obj,
-        'posts': posts,
+        'posts': page_obj.object_list,
         'title': 'Лента подписок',
         'h1': 'Лента подписок',
     }
-    return render(request, 'posts/follow.html', context)
+    response = render(request, 'posts/follow.html', context)
+    response['X-Feed-Path'] = feed.record_path(source)
+    return response
 
 
 @login_required
 def profile_follow(request, username):
     # Подписаться на автора
-    author = get_object_or_404(User, username=username)
-    follower = Follow.objects.filter(user=request.user, author=author)
-    if request.user != author and not follower.exists():
-        Follow.objects.create(user=request.user, author=author)
-        return redirect('posts:follow_index')
+    author = get_object_or_404(cached(User), username=username)
+    if request.user != author:
+        _, created = Follow.objects.get_or_create(
+            user=request.user, author=author
+        )
+        if created:
+            return redirect('posts:follow_index')
     return redirect('posts:profile', (request.user.username))
 
 
 @login_required
 def profile_unfollow(request, username):
     # Дизлайк, отписка
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(cached(User), username=username)
     following = Follow.objects.filter(user=request.user, author=author)
     following.delete()
     return redirect('posts:follow_index')
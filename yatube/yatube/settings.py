@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.StaleCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -147,8 +148,83 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Кэш в два уровня: память процесса (L1) перед общим для всех воркеров
+# кэшем 'shared' (L2). Записи в кэш рассылаются другим процессам машины
+# через журнал в файле SQLite (BUS) и выбрасывают их копии из L1.
+# L2 задаётся окружением: YATUBE_CACHE_BACKEND и YATUBE_CACHE_LOCATION,
+# например django.core.cache.backends.memcached.MemcachedCache и
+# 127.0.0.1:11211 (клиент python-memcached в requirements.txt). Файловый
+# кэш по умолчанию годится только для разработки: его add() не атомарен,
+# и блокировка пересчёта в core.cache.fetch не держится, а каждый set()
+# перечисляет весь каталог. Каталог кэша и журнала - YATUBE_CACHE_DIR,
+# по умолчанию внутри проекта, а не в общем /tmp: кэш читает из него
+# pickle. Тесты переносят кэш во временный каталог (core.test_runner).
+CACHE_DIR = os.environ.get(
+    'YATUBE_CACHE_DIR', os.path.join(BASE_DIR, 'cache')
+)
+CACHE_BACKEND = os.environ.get(
+    'YATUBE_CACHE_BACKEND',
+    'django.core.cache.backends.filebased.FileBasedCache'
+)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.near_cache.NearCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'SIZE': 1000,
+            'TIMEOUT': 30,
+            'BUS': os.path.join(CACHE_DIR, 'invalidations.sqlite3'),
+            'POLL_INTERVAL': 0.1,
+        },
+    },
+    'shared': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION', os.path.join(CACHE_DIR, 'cache')
+        ),
+    },
 }
+if CACHE_BACKEND.endswith('FileBasedCache'):
+    CACHES['shared']['OPTIONS'] = {'MAX_ENTRIES': 10_000}
+TEST_RUNNER = 'core.test_runner.IsolatedCacheRunner'
+# Сколько секунд даётся БД на пересчёт записи кэша, у которой есть
+# устаревшая копия; дольше - отдаётся копия с заголовком Warning
+CACHE_REFRESH_BUDGET = 0.5
+# Таблицы, выборки из которых можно кэшировать (core.querycache): запись
+# в любую из них сбрасывает закэшированные выборки этой таблицы
+QUERY_CACHE_TABLES = (
+    'posts_post', 'posts_group', 'posts_follow', 'auth_user'
+)
+QUERY_CACHE_TIMEOUT = 60 * 10
+# Курсорная пагинация лент по (pub_date, id) вместо ?page=N
+CURSOR_PAGINATION = False
+# Ленты главной, групп и профилей из строк posts.rows.PostRow вместо
+# экземпляров Post; False возвращает модели в page_obj
+FEED_READ_MODEL = True
+# Дальше этого числа строк админка не считает списки точно
+ADMIN_EXACT_COUNT_LIMIT = 10_000
+# Размер пакета массовых действий админки с постами
+ADMIN_BATCH_SIZE = 500
+# Сколько последних записей хранится в материализованной ленте подписок
+FEED_DEPTH = 1000
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подтягиваются при чтении
+FEED_FANOUT_THRESHOLD = 5000
+FEED_CELEBRITIES_TIMEOUT = 300
+# Сколько хранится целая страница для анонимных пользователей
+PAGE_CACHE_TIMEOUT = 60 * 10
+# Загрузки сразу пишутся во временный файл, а не в память процесса
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Ограничения и перекодирование картинок постов (posts.ingest)
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_MAX_SIDE = 2048
+POST_IMAGE_QUALITY = 85
+# Миниатюры строит команда thumbnail_worker, страницы берут только готовые
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+# Метаданные миниатюр: LRU процесса перед общим кэшем и базой
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_LRU_SIZE = 2048
+THUMBNAIL_LRU_TIMEOUT = 60 * 5